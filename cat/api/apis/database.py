@@ -1,5 +1,5 @@
 import os
-from flask import request
+from flask import request, Response
 from flask_restplus import Resource, Namespace, fields
 from flask_jwt_extended import jwt_required
 from flask_restplus.inputs import boolean
@@ -107,19 +107,32 @@ class Column(Resource):
         api.abort(404, f'Column {column_name} not found')
 
 
+column_values_parser = api.parser()
+column_values_parser.add_argument('limit', type=int, location='args', help='Maximum number of values')
+column_values_parser.add_argument('offset', type=int, location='args', help='Number of (ordered) values to skip')
+column_values_parser.add_argument('prefix', type=str, location='args', help='Only values starting with the prefix')
+
+
 @api.route('/tables/<table_name>/columns/<column_name>/values')
 class Column(Resource):
     @api.doc('colum_values')
-    @api.expect(column_data)
+    @api.expect(column_data, column_values_parser)
     @jwt_required
     def get(self, table_name, column_name):
         db = try_database(api)
+        args = column_values_parser.parse_args()
         tables = [table for table in db.get_metaschema().tables if table.name == table_name]
         if len(tables) == 1:
             columns = [column for column in tables[0].columns if column.name == column_name]
             if len(columns) == 1:
-                result = db.select_distinct(table_name, column_name)
-                return [value for row in result for column, value in row.items()], 200
+                if args['limit'] is None and not args['offset'] and not args['prefix']:
+                    result = db.select_distinct(table_name, column_name, compact=True)
+                    return result.column(column_name), 200
+                # pages are ordered, the total count allows the client to request the remaining pages
+                result = db.select_distinct(table_name, column_name, limit=args['limit'], offset=args['offset'],
+                                            prefix=args['prefix'], compact=True)
+                total = db.select_distinct(table_name, column_name, count=True, prefix=args['prefix'], limit=1)
+                return result.column(column_name), 200, {'X-Total-Count': str(total['count'])}
         api.abort(404, f'Column {table_name}.{column_name} not found')
 
 
@@ -133,6 +146,17 @@ class ProcedureList(Resource):
         return procedures, 200
 
 
+@api.route('/metrics')
+class DatabaseMetrics(Resource):
+    @api.doc('database_metrics')
+    @jwt_required
+    def get(self):
+        db = try_database(api)
+        if boolean(request.args.get('json', False)):
+            return db.get_query_stats(), 200
+        return Response(db.get_query_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 def transform_table(table: DBTable):
     return {
         'name': table.name,
@@ -41,8 +41,6 @@ DATABASE_ENDPOINT_KEY = 'database_endpoint'
 DUCKLING_ENDPOINT_KEY = 'duckling_endpoint'
 MAX_PROPOSE_OPTIONS = 5
 
-INTERMEDIATE_RESULTS_TABLE = 'matches'
-
 
 class DateTypeEnum(Enum):
     date = 1
@@ -125,6 +123,52 @@ def load_json(filepath):
         logger.error(e)
 
 
+# Result paging
+def build_result_query(db: PostgreSQLDatabase, target_table_alias: str, additional_tables: List[str],
+                       constraints: Dict[str, Dict[str, List[Dict[str, any]]]], distinct_on_target: str = None) -> Dict:
+    """
+    Returns a compact descriptor of a select result, which is stored in the result slot instead of the result rows.
+    The rows are fetched page by page with get_result_page.
+    """
+    query = {
+        'target_table_alias': target_table_alias,
+        'additional_tables': list(additional_tables),
+        'constraints': constraints,
+        'distinct_on_target': distinct_on_target
+    }
+    return {'query': query, 'count': db.select_count(**query)}
+
+
+def get_result_count(result_query: Dict) -> int:
+    return result_query['count'] if result_query else 0
+
+
+def get_result_page(db: PostgreSQLDatabase, result_query: Dict, offset: int = 0,
+                    limit: int = MAX_PROPOSE_OPTIONS) -> List[Dict]:
+    """
+    Returns limit rows of a result from offset on. Without a limit all remaining rows are returned, they are streamed
+    from a server side cursor instead of fetched at once.
+    """
+    if not result_query or offset < 0:
+        return []
+    if limit is None:
+        return list(iter_result_rows(db, result_query, offset))
+    rows = db.select(**result_query['query'], limit=limit, offset=offset)
+    if limit == 1:
+        return [rows] if rows else []
+    return rows
+
+
+def iter_result_rows(db: PostgreSQLDatabase, result_query: Dict, offset: int = 0) -> Iterator[Dict]:
+    """
+    Streams the rows of a result from offset on, db.itersize rows per round trip. Close the iterator if it is not
+    consumed completely, it holds a database connection.
+    """
+    if not result_query or offset < 0:
+        return iter([])
+    return db.select_iter(**result_query['query'], offset=offset)
+
+
 def get_placeholders(template: str):
     return re.findall('{(.+?)}', template)
 
@@ -0,0 +1,52 @@
+from typing import List, Sequence
+
+import numpy as np
+
+
+class Random:
+    """
+    Seedable random generator of the bot generation, wrapping a numpy Generator. The methods follow the stdlib random
+    module (randint includes the upper bound), integers follows numpy (it does not).
+
+    Independent sub-streams, e.g. for the dialogs of a simulation worker, are derived with spawn, so a run with the
+    same seed draws the same values no matter how its work is split.
+    """
+
+    def __init__(self, seed: int = None, seed_sequence: np.random.SeedSequence = None):
+        self.seed_sequence = seed_sequence if seed_sequence is not None else np.random.SeedSequence(seed)
+        self.generator = np.random.default_rng(self.seed_sequence)
+
+    @property
+    def seed(self) -> int:
+        return self.seed_sequence.entropy
+
+    def spawn(self, n: int) -> List['Random']:
+        return [Random(seed_sequence=seed_sequence) for seed_sequence in self.seed_sequence.spawn(n)]
+
+    def random(self) -> float:
+        return float(self.generator.random())
+
+    def uniform(self, low: float = 0.0, high: float = 1.0) -> float:
+        return float(self.generator.uniform(low, high))
+
+    def normal(self, mu: float = 0.0, sigma: float = 1.0) -> float:
+        return float(self.generator.normal(mu, sigma))
+
+    def randint(self, low: int, high: int) -> int:
+        """A random integer in [low, high]."""
+        return int(self.generator.integers(low, high, endpoint=True))
+
+    def integers(self, low: int, high: int = None, size: int = None):
+        """A random integer in [low, high) or an array of size of them."""
+        return self.generator.integers(low, high, size=size)
+
+    def choice(self, sequence: Sequence):
+        """A random element of the sequence, unlike numpy it is returned as it is."""
+        return sequence[int(self.generator.integers(len(sequence)))]
+
+    def shuffle(self, sequence: list):
+        self.generator.shuffle(sequence)
+
+
+# used where no generator is passed, e.g. outside of the bot generation
+default_random = Random()
@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Tuple, Union
+
+import psycopg2 as pg
+import psycopg2.errors as errors
+from psycopg2.extras import RealDictCursor, RealDictRow
+
+from .common import *
+from .database import PostgreSQLDatabase
+from .results import CompactResult, RESULT_TABLE_PREFIX
+from .fuzzy import get_most_similar
+from .stats import instrumented_async, get_caller
+
+# aiopg is only needed by the asyncio backend
+try:
+    import aiopg
+except ImportError:
+    aiopg = None
+
+logger = logging.getLogger('db')
+
+
+class AsyncPostgreSQLDatabase:
+    """
+    Asyncio variant of PostgreSQLDatabase with the same surface, e.g. for the (async) Rasa SDK action server.
+
+    Schema introspection, the join plan and the query generation are shared with the synchronous database, the
+    generated statements are executed on an aiopg connection pool. Methods that run several dependent queries to pick
+    a join table or the next slot run the synchronous implementation in a thread, so they do not block the event loop
+    either.
+
+    The queries are recorded in the query statistics of the synchronous database under the same callers. Unlike the
+    synchronous database, statements are not prepared server side.
+    """
+    _instance = None
+
+    def __init__(self, db: PostgreSQLDatabase, pool_size: int = 10):
+        if aiopg is None:
+            raise Exception('The asyncio database backend requires aiopg, install it with pip install aiopg')
+        self.db = db
+        self.pool_size = pool_size
+        self._pool = None
+        # the synchronous database runs its queries on a single connection unless it has a pool
+        self._executor = ThreadPoolExecutor(max_workers=max(1, db.pool_size or 1))
+
+    @staticmethod
+    async def get_instance(db_name=None, schema_name=None, user=None, password=None, host=None, port=None,
+                           pool_size=10, **kwargs) -> 'AsyncPostgreSQLDatabase':
+        """
+        Returns the async database, which wraps the PostgreSQLDatabase instance. Connection parameters and further
+        keyword arguments are passed to PostgreSQLDatabase.get_instance.
+        """
+        if not AsyncPostgreSQLDatabase._instance or db_name:
+            loop = asyncio.get_event_loop()
+            db = await loop.run_in_executor(None, partial(PostgreSQLDatabase.get_instance, db_name, schema_name,
+                                                          user, password, host, port, **kwargs))
+            if AsyncPostgreSQLDatabase._instance:
+                await AsyncPostgreSQLDatabase._instance.disconnect()
+            instance = AsyncPostgreSQLDatabase(db, pool_size=pool_size)
+            await instance.connect()
+            AsyncPostgreSQLDatabase._instance = instance
+        return AsyncPostgreSQLDatabase._instance
+
+    async def connect(self):
+        if self._pool is None:
+            logger.debug(f'Creating an asyncio connection pool with up to {self.pool_size} connections')
+            self._pool = await aiopg.create_pool(self.db._get_dsn(), minsize=1, maxsize=self.pool_size)
+
+    async def disconnect(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+        self._executor.shutdown(wait=False)
+
+    def get_metaschema(self):
+        return self.db.get_metaschema()
+
+    @instrumented_async
+    async def select(self,
+                     target_table_alias: str,
+                     additional_tables: List[str] = [],
+                     constraints: Dict[str, Dict[str, List[Dict[str, any]]]] = {},
+                     distinct_on_target=None,
+                     select_dict={},
+                     order: Tuple[any, str] = (1, 'ASC'),
+                     limit: int = None,
+                     offset: int = None,
+                     compact: bool = False) -> Union[List[RealDictRow], CompactResult]:
+        """Same as PostgreSQLDatabase.select, but the query is not prepared server side."""
+        query, params = self.db._get_select_query(target_table_alias=target_table_alias,
+                                                  additional_tables=additional_tables,
+                                                  constraints=constraints,
+                                                  select_dict=select_dict,
+                                                  distinct_on_target=distinct_on_target,
+                                                  order=order)
+        if limit:
+            query += ' LIMIT %(limit)s'
+            params['limit'] = limit
+        if offset:
+            query += ' OFFSET %(offset)s'
+            params['offset'] = offset
+        if compact:
+            return await self._query_compact(query, params)
+        if limit == 1:
+            row = await self._run(query, params, lambda curs: curs.fetchone())
+            if row:
+                return row
+            return None
+        return await self._query_all(query, params)
+
+    @instrumented_async
+    async def select_count(self,
+                           target_table_alias: str,
+                           additional_tables: List[str] = [],
+                           constraints: Dict[str, Dict[str, List[Dict[str, any]]]] = {},
+                           distinct_on_target=None,
+                           select_dict={}) -> int:
+        """Same as PostgreSQLDatabase.select_count, but the query is not prepared server side."""
+        query, params = self.db._get_select_query(target_table_alias=target_table_alias,
+                                                  additional_tables=additional_tables,
+                                                  constraints=constraints,
+                                                  select_dict=select_dict,
+                                                  distinct_on_target=distinct_on_target,
+                                                  order=None)
+        row = await self._run(f'SELECT COUNT(*) AS count FROM ({query}) AS results', params,
+                              lambda curs: curs.fetchone())
+        return row['count'] if row else 0
+
+    @instrumented_async
+    async def select_into_table(self,
+                                target_table_alias: str,
+                                additional_tables: List[str] = [],
+                                constraints={},
+                                select_dict={},
+                                distinct_on_target: str = None,
+                                result_table=RESULT_TABLE_PREFIX,
+                                order: Tuple[any, str] = None,
+                                analyze=False,
+                                session_id: str = None):
+        if session_id is not None:
+            for expired_table in self.db._pop_expired_result_tables():
+                await self._execute(f'DROP TABLE IF EXISTS {expired_table}')
+        # statements are not prepared on aiopg connections, so recreating and refilling the table run the same way
+        result_table, fill_temp, query, params, _ = self.db._get_select_into_table_query(
+            target_table_alias, additional_tables, constraints, select_dict, distinct_on_target, result_table, order,
+            session_id)
+        try:
+            # without an explicit transaction the statements of one query string run in a single transaction
+            rowcount = await self._run(query, params, lambda curs: curs.rowcount, prefix=fill_temp)
+        except pg.Error:
+            if session_id is not None:
+                self.db._result_tables.invalidate(session_id)
+            raise
+        self.db._result_rowcounts[result_table] = rowcount
+        if analyze:
+            await self._execute(f'ANALYZE {result_table}')
+        return result_table
+
+    def get_session_result_table(self, session_id: str) -> str:
+        return self.db.get_session_result_table(session_id)
+
+    @instrumented_async
+    async def release_session_result_table(self, session_id: str):
+        result_table = self.db._result_tables.release(session_id)
+        if result_table:
+            self.db._result_rowcounts.pop(result_table, None)
+            await self._execute(f'DROP TABLE IF EXISTS {result_table}')
+
+    @instrumented_async
+    async def select_all(self, table_name='matches'):
+        return await self._query_all(f'SELECT * FROM {table_name}')
+
+    @instrumented_async
+    async def select_distinct(self, table_name: str, column_name: str, count=False, limit: int = None,
+                              compact=False, offset: int = None, prefix: str = None):
+        query, params = self.db._get_select_distinct_query(table_name, column_name, count, limit, offset, prefix)
+        # shares the result cache of the synchronous database, only base tables are cached
+        if not self.db._is_base_table(table_name):
+            return await self._select_distinct(query, params, limit, compact)
+        key = (query, tuple(sorted(params.items())), limit, compact)
+        version = self.db._get_table_version_result(await self._run(*self.db._get_table_version_query(table_name),
+                                                                     lambda curs: curs.fetchone()))
+        result = self.db._result_cache.get(table_name, key, version)
+        if result is None:
+            result = await self._select_distinct(query, params, limit, compact)
+            self.db._result_cache.put(table_name, key, version, result)
+        return result
+
+    async def _select_distinct(self, query, params, limit, compact):
+        if compact:
+            return await self._query_compact(query, params)
+        if limit == 1:
+            return await self._run(query, params, lambda curs: curs.fetchone()) or {}
+        return await self._query_all(query, params)
+
+    @instrumented_async
+    async def call_procedure(self, name, operation, arguments):
+        proc = self.db._get_procedure(name, operation, arguments)
+        self.db._invalidate_caches()
+        proc_params = tuple([arguments[param_name] for param_name in proc.parameter_names()])
+        if self._pool is None:
+            raise Exception('No active connection to database')
+        start = time.perf_counter()
+        # aiopg connections are in autocommit mode, so there is nothing to commit or roll back
+        async with self._pool.acquire() as connection:
+            async with connection.cursor(cursor_factory=RealDictCursor) as curs:
+                try:
+                    if operation == OPERATION_SELECT:
+                        await curs.callproc(name, proc_params)
+                        result = await curs.fetchall(), None
+                    else:
+                        await curs.execute(*self.db._get_call_query(proc, arguments))
+                        result = None, None
+                except (errors.RaiseException, errors.InFailedSqlTransaction) as e:
+                    return None, e.args[0].split('\n')[0]
+                rows = curs.rowcount
+        # never explained, explaining would call the procedure again
+        self.db._record_query(*self.db._get_procedure_query(proc, operation, arguments), '',
+                              time.perf_counter() - start, rows, explain=False)
+        return result
+
+    @instrumented_async
+    async def get_similar_string_values(self, table: str, column: str, value: str, gt_threshold: float = 0):
+        if (table, column) not in self.db._distinct_values:
+            result = await self._query_compact(self.db._get_distinct_values_query(table, column))
+            self.db._cache_distinct_values(table, column, result.column(column))
+        distinct_values = self.db._distinct_values[(table, column)]
+        if distinct_values is not None:
+            return get_most_similar(distinct_values, value, gt_threshold)
+        query, params = self.db._get_similar_string_values_query(table, column, value, gt_threshold)
+        return self.db._get_similar_string_values_result(await self._query_compact(query, params), column)
+
+    async def should_join_next_table(self, target_table_name, joined_tables=[], constraints={},
+                                     requestable_columns={}):
+        return await self._run_sync(self.db.should_join_next_table, target_table_name, joined_tables, constraints,
+                                    requestable_columns)
+
+    async def get_best_join_table(self, target_table_name, joined_tables=[], constraints={}, requestable_columns={},
+                                  **kwargs):
+        return await self._run_sync(self.db.get_best_join_table, target_table_name, joined_tables, constraints,
+                                    requestable_columns, **kwargs)
+
+    async def get_next_slot(self, target_table, joined_tables=[], constraints={}, requestable_columns={},
+                            result_table='matches', as_table_column=False):
+        return await self._run_sync(self.db.get_next_slot, target_table, joined_tables, constraints,
+                                    requestable_columns, result_table, as_table_column)
+
+    async def get_column_sample(self, table_name, column_name):
+        return await self._run_sync(self.db.get_column_sample, table_name, column_name)
+
+    async def can_cast_datatype(self, value, datatype) -> bool:
+        return await self._run_sync(self.db.can_cast_datatype, value, datatype)
+
+    def get_join_tables(self, table_name, directed=True):
+        return self.db.get_join_tables(table_name, directed=directed)
+
+    def get_column_type(self, table_name, column_name):
+        return self.db.get_column_type(table_name, column_name)
+
+    @staticmethod
+    def build_constraint(values: List[any], operator: str = OPERATOR_EQUAL, is_reference: bool = False):
+        return PostgreSQLDatabase.build_constraint(values, operator, is_reference)
+
+    async def _run_sync(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def _run(self, sql: str, data, fetch=None, compact=False, prefix=''):
+        """
+        Executes prefix + sql on a pooled connection and records it like PostgreSQLDatabase does.
+        """
+        if self._pool is None:
+            logger.error('Could not execute query. Not database connection established.')
+            return None
+        start = time.perf_counter()
+        async with self._pool.acquire() as connection:
+            async with connection.cursor(cursor_factory=None if compact else RealDictCursor) as curs:
+                await curs.execute(prefix + sql, data)
+                result = fetch(curs) if fetch else None
+                if asyncio.iscoroutine(result):
+                    result = await result
+                rows = curs.rowcount
+        await self._record_query(sql, data, prefix, time.perf_counter() - start, rows)
+        return result
+
+    async def _record_query(self, sql: str, data, prefix: str, duration: float, rows: int):
+        caller = get_caller()
+        slow = self.db.slow_query_threshold is not None and duration >= self.db.slow_query_threshold
+        if slow and self.db.explain_slow_queries and not prefix:
+            # explaining runs the query again on the synchronous connection
+            await self._run_sync(self.db._record_query, sql, data, prefix, duration, rows, caller=caller)
+        else:
+            self.db._record_query(sql, data, prefix, duration, rows, caller=caller)
+
+    async def _query_all(self, sql: str, data={}):
+        return await self._run(sql, data, lambda curs: curs.fetchall()) or []
+
+    async def _query_compact(self, sql: str, data={}) -> CompactResult:
+        async def fetch(curs):
+            return CompactResult([c.name for c in curs.description], await curs.fetchall())
+
+        result = await self._run(sql, data, fetch, compact=True)
+        return result if result is not None else CompactResult((), [])
+
+    async def _execute(self, sql: str, data={}):
+        await self._run(sql, data)
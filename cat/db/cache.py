@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import pickle
+import hashlib
+import logging
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger('db')
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+PARAMETER_PATTERN = re.compile(r'%\((\w+)\)s')
+# increase whenever the pickled schema classes change
+SNAPSHOT_VERSION = 2
+
+
+class InformativityCache:
+    """
+    File backed cache of the base table informativities.
+
+    Every table entry is stored with the data version of the table (the insert, update and delete counters of
+    pg_stat_user_tables), so only tables that were modified since the cache was written have to be recomputed.
+    """
+
+    def __init__(self, db_name: str, schema_name: str, host: str, port: int, cache_dir: str = CACHE_DIR):
+        self.key = f'{host}:{port}/{db_name}/{schema_name}'
+        self.path = os.path.join(cache_dir, f'informativity_{host}_{port}_{db_name}_{schema_name}.json')
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, dict]:
+        """
+        :return: A dict with the cached version and informativity per table
+        """
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                content = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Could not read informativity cache {self.path}: {e}')
+            return {}
+        if content.get('key') != self.key:
+            return {}
+        return content.get('tables', {})
+
+    def save(self, tables: Dict[str, dict]):
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                # write to a temporary file first, so a crash never leaves a corrupted cache
+                tmp_path = f'{self.path}.tmp'
+                with open(tmp_path, mode='w') as f:
+                    json.dump({'key': self.key, 'tables': tables}, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f'Could not write informativity cache {self.path}: {e}')
+
+    @staticmethod
+    def get_stale_tables(cached_tables: Dict[str, dict], versions: Dict[str, list]):
+        return [table for table, version in versions.items()
+                if table not in cached_tables or cached_tables[table].get('version') != version]
+
+
+class QueryCache:
+    """
+    LRU cache of generated SQL, keyed by the shape of a query (tables, selected columns and constraint operators but not
+    the constraint values). It also derives the server side prepared statement of a cached query.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._queries = OrderedDict()
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            query = self._queries.get(key)
+            if query is None:
+                self.misses += 1
+                return None
+            self._queries.move_to_end(key)
+            self.hits += 1
+            return query
+
+    def put(self, key, query: str):
+        with self._lock:
+            self._queries[key] = query
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_size:
+                self._queries.popitem(last=False)
+
+    def get_statement(self, query: str) -> Tuple[str, str, List[str]]:
+        """
+        Returns the prepared statement of a query with named (pyformat) parameters.
+        :return: The statement name, the statement with positional parameters and the ordered parameter names
+        """
+        with self._lock:
+            statement = self._statements.get(query)
+            if statement:
+                self._statements.move_to_end(query)
+                return statement
+        parameter_names = list(dict.fromkeys(PARAMETER_PATTERN.findall(query)))
+        positions = dict([(name, i + 1) for i, name in enumerate(parameter_names)])
+        statement_query = PARAMETER_PATTERN.sub(lambda m: f'${positions[m.group(1)]}', query).replace('%%', '%')
+        name = f'cat_{hashlib.md5(query.encode("utf-8")).hexdigest()[:16]}'
+        statement = (name, statement_query, parameter_names)
+        with self._lock:
+            self._statements[query] = statement
+            while len(self._statements) > self.max_size:
+                self._statements.popitem(last=False)
+        return statement
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._queries)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._queries.clear()
+            self._statements.clear()
+
+
+class ResultCache:
+    """
+    TTL and LRU bounded cache of query results on a single table. Every result is stored with the data version of the
+    table (see InformativityCache) and is only returned while the version did not change and it is younger than ttl
+    seconds. The statistics collector reports modifications with a small delay, the ttl bounds how long such a result
+    can be stale.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table: str, key, version):
+        """
+        :return: The cached result, None if there is no valid result
+        """
+        with self._lock:
+            entry = self._results.get((table, key))
+            if entry is None or entry[1] != version or (entry[2] is not None and entry[2] < time.monotonic()):
+                if entry is not None:
+                    del self._results[(table, key)]
+                self.misses += 1
+                return None
+            self._results.move_to_end((table, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, table: str, key, version, result):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._results[(table, key)] = (result, version, expires)
+            self._results.move_to_end((table, key))
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def invalidate(self, table: str = None):
+        with self._lock:
+            if table is None:
+                self._results.clear()
+            else:
+                for key in [key for key in self._results.keys() if key[0] == table]:
+                    del self._results[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._results)
+            }
+
+
+class MetaSchemaSnapshot:
+    """
+    Pickled snapshot of the introspected schema, only valid as long as the catalog fingerprint of the schema does not
+    change.
+    """
+
+    def __init__(self, db_name: str, schema_name: str, host: str, port: int, cache_dir: str = CACHE_DIR):
+        self.path = os.path.join(cache_dir, f'metaschema_{host}_{port}_{db_name}_{schema_name}.pickle')
+
+    def load(self, fingerprint: str):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, mode='rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError) as e:
+            logger.warning(f'Could not read schema snapshot {self.path}: {e}')
+            return None
+        if snapshot.get('fingerprint') != fingerprint or snapshot.get('version') != SNAPSHOT_VERSION:
+            logger.debug('Schema snapshot is outdated')
+            return None
+        return snapshot['content']
+
+    def save(self, fingerprint: str, content):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, mode='wb') as f:
+                pickle.dump({'fingerprint': fingerprint, 'version': SNAPSHOT_VERSION, 'content': content}, f)
+            os.replace(tmp_path, self.path)
+        except (OSError, pickle.PicklingError) as e:
+            logger.warning(f'Could not write schema snapshot {self.path}: {e}')
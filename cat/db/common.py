@@ -1,3 +1,5 @@
+import math
+
 OPERATION_SELECT = 'select'
 OPERATION_CALL = 'call'
 COUNT = 'count'
@@ -11,6 +13,9 @@ OPERATOR_LT = '<'
 OPERATOR_GTE = '>='
 OPERATOR_LTE = '<='
 
+INFORMATIVITY_EXACT = 'exact'
+INFORMATIVITY_APPROXIMATE = 'approximate'
+
 
 def slot_to_table_column_with_join_table_column(slot: str):
     s = slot.split('___')
@@ -99,3 +104,23 @@ def column_to_slot(table_name, column_name):
 
 def is_value(v):
     return v and v != DONT_CARE
+
+
+def estimate_normalized_entropy(null_frac: float, n_distinct: float, most_common_freqs: list, rows: float):
+    """
+    Estimates the normalized entropy of a column from its pg_stats entry. The frequencies of the most common values
+    are exact, the remaining values are assumed to be uniformly distributed.
+    """
+    null_frac = null_frac or 0
+    most_common_freqs = most_common_freqs or []
+    # a negative n_distinct is the number of distinct values divided by the number of rows
+    distinct = -n_distinct * rows if n_distinct < 0 else n_distinct
+    distinct = max(int(round(distinct)), len(most_common_freqs))
+    probabilities = most_common_freqs + ([null_frac] if null_frac > 0 else [])
+    entropy = sum([p * math.log2(1 / p) for p in probabilities if p > 0])
+    remaining_frequency = 1 - null_frac - sum(most_common_freqs)
+    remaining_values = distinct - len(most_common_freqs)
+    if remaining_values > 0 and remaining_frequency > 0:
+        entropy += remaining_frequency * math.log2(remaining_values / remaining_frequency)
+    groups = distinct + (1 if null_frac > 0 else 0)
+    return entropy / (math.log2(groups) if groups > 1 else 1)
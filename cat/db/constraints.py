@@ -0,0 +1,119 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Dict, List, Tuple
+
+from .common import *
+
+ConstraintsDict = Dict[str, Dict[str, List[Dict[str, any]]]]
+
+
+def get_where_conditions(constraints: ConstraintsDict, params={}, param_num=0) -> Tuple[str, Dict[str, any], int]:
+    where_clause = ''
+    filtered_constraints = dict([(table, col_constr) for table, col_constr in constraints.items() if col_constr])
+    for table_alias, column_constraints in filtered_constraints.items():
+        for column_name, col_constraints in column_constraints.items():
+            for c in col_constraints:
+                values = c['values']
+                operator = c['operator']
+                # skip dont care conditions
+                if len(values) == 1 and values[0] == DONT_CARE:
+                    continue
+                param_name = f'param{param_num}'
+                if operator == OPERATOR_IN:
+                    # an array keeps the query text independent of the number of values, as untyped literal it
+                    # takes the array type of the column (e.g. for string values of an integer column)
+                    where_clause += f" AND {table_alias}.{column_name} = ANY(%({param_name})s)"
+                    params[param_name] = to_array_literal(values)
+                else:
+                    where_clause += f" AND {table_alias}.{column_name} {operator} %({param_name})s"
+                    params[param_name] = tuple(values) if len(values) > 1 else values[0]
+                param_num += 1
+    return where_clause, params, param_num
+
+
+def to_array_literal(values: List[any]) -> str:
+    """Returns the PostgreSQL array literal of the values, e.g. {"1","2"} for ['1', 2]."""
+    elements = ['NULL' if value is None else
+                '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values]
+    return '{' + ','.join(elements) + '}'
+
+
+def get_real_constraints(constraints: ConstraintsDict) -> ConstraintsDict:
+    """Returns the constraints of the tables that have at least one constraint that is not DONT_CARE."""
+    return dict([(table, column_constr) for table, column_constr in constraints.items()
+                 if column_constr and
+                 any([is_value(val) for col, constrs in column_constr.items()
+                      for constr in constrs
+                      for val in constr['values']])])
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple([_freeze(v) for v in value])
+    if isinstance(value, dict):
+        return tuple(sorted([(k, _freeze(v)) for k, v in value.items()], key=lambda item: item[0]))
+    return value
+
+
+class CompiledConstraints(Mapping):
+    """
+    Immutable form of a constraints dict ({table alias: {column: [constraint]}}).
+
+    The WHERE conditions with their parameters, the constrained tables and the real (not DONT_CARE) constraints are
+    derived once when the constraints are compiled, e.g. once per user inform, instead of on every database call. It
+    is a read-only mapping with the same structure as the constraints dict, so it can be passed wherever a constraints
+    dict is accepted, and it is hashable, so it can be used as cache key.
+    """
+    __slots__ = ('_constraints', '_key', '_hash', 'where_clause', '_params', 'param_count', 'tables',
+                 'real_constraints')
+
+    def __init__(self, constraints: ConstraintsDict):
+        self._constraints = dict([(table, MappingProxyType(dict(
+            [(column, tuple([MappingProxyType(dict(c)) for c in column_constraints]))
+             for column, column_constraints in column_constraints.items()])))
+            for table, column_constraints in constraints.items()])
+        self._key = _freeze(constraints)
+        self._hash = hash(self._key)
+        self.where_clause, self._params, self.param_count = get_where_conditions(self._constraints, {}, 0)
+        self.tables = tuple([table for table, column_constraints in self._constraints.items() if column_constraints])
+        self.real_constraints = MappingProxyType(get_real_constraints(self._constraints))
+
+    @staticmethod
+    def compile(constraints) -> 'CompiledConstraints':
+        if isinstance(constraints, CompiledConstraints):
+            return constraints
+        return CompiledConstraints(constraints or {})
+
+    @property
+    def params(self) -> Dict[str, any]:
+        """A new dict with the parameters of the WHERE conditions, callers may add their own parameters."""
+        return dict(self._params)
+
+    def __getitem__(self, table: str):
+        return self._constraints[table]
+
+    def __iter__(self):
+        return iter(self._constraints)
+
+    def __len__(self):
+        return len(self._constraints)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, CompiledConstraints):
+            return self._key == other._key
+        return NotImplemented
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f'CompiledConstraints({self._constraints})'
+
+    def to_dict(self) -> ConstraintsDict:
+        """Returns a mutable (and JSON serializable) copy of the constraints."""
+        return dict([(table, dict([(column, [dict(c) for c in column_constraints])
+                                   for column, column_constraints in column_constraints.items()]))
+                     for table, column_constraints in self._constraints.items()])
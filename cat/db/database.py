@@ -1,29 +1,69 @@
 import copy
 import logging
+import os
+import hashlib
+import threading
+import time
+from itertools import count
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from .graph import *
 from .common import *
 from .schema import *
-from typing import List, Dict, Tuple, Union
+from .pool import ConnectionPool
+from .results import SessionResultTables, CompactResult, RESULT_TABLE_PREFIX, RESULT_TABLE_PATTERN
+from .cache import InformativityCache, QueryCache, ResultCache, MetaSchemaSnapshot, CACHE_DIR
+from .sampling import ColumnSamplePool
+from .fuzzy import get_most_similar
+from .plan import JoinPlan
+from .stats import QueryStats, instrumented, get_caller, with_caller
+from .constraints import CompiledConstraints, get_where_conditions, get_real_constraints
+from typing import List, Dict, Tuple, Union, Iterator, Callable
 
 import psycopg2 as pg
 import psycopg2.errors as errors
-from psycopg2.extras import RealDictCursor, RealDictRow
+from psycopg2.extras import RealDictCursor, RealDictRow, execute_batch, execute_values
 import psycopg2.extensions as pgx
-from numpy import random
+import numpy as np
 
 DEC2FLOAT = pgx.new_type(pgx.DECIMAL.values, 'DEC2FLOAT',
                          lambda value, curs: float(value) if value is not None else None)
 pgx.register_type(DEC2FLOAT)
 
 logger = logging.getLogger('db')
+slow_query_logger = logging.getLogger('db.slow')
 logging.basicConfig(level=logging.DEBUG)
 
 
+class StatementConnection(pgx.connection):
+    """
+    A connection that keeps track of the statements prepared in its session. Like the query cache it keeps at most
+    max_statements statements, the least recently used one is deallocated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = OrderedDict()
+
+    def prepare(self, curs, name: str, statement: str, max_statements: int):
+        if name in self.prepared_statements:
+            self.prepared_statements.move_to_end(name)
+            return
+        curs.execute(f'PREPARE {name} AS {statement}')
+        self.prepared_statements[name] = statement
+        while len(self.prepared_statements) > max_statements:
+            evicted, _ = self.prepared_statements.popitem(last=False)
+            curs.execute(f'DEALLOCATE {evicted}')
+
+
 # noinspection SqlResolve,SqlResolve,SqlNoDataSourceInspection
 class PostgreSQLDatabase:
     _instance = None
 
-    def __init__(self, db_name: str, schema_name: str, user: str, password: str, host: str, port: int, cache=True):
+    def __init__(self, db_name: str, schema_name: str, user: str, password: str, host: str, port: int, cache=True,
+                 pool_size: int = 1, session_ttl: float = 3600, informativity_mode: str = INFORMATIVITY_EXACT,
+                 cache_dir: str = CACHE_DIR, refresh_cache_async: bool = False, join_plan_file: str = None):
         if PostgreSQLDatabase._instance:
             raise Exception('PostgreSQLDatabase is a singleton, use get_instance() to get the database instance')
         else:
@@ -33,36 +73,97 @@ class PostgreSQLDatabase:
             self.password = password
             self.host = host
             self.port = port
+            # a pool size > 1 enables the connection pool, otherwise a single connection is shared
+            self.pool_size = pool_size
 
             self._metaschema: MetaSchema = None
             self._informativity_cache = None
+            # the informativity cache is persisted and only recomputed for tables that changed since
+            self._informativity_store = InformativityCache(db_name, schema_name, host, port, cache_dir=cache_dir)
+            self.refresh_cache_async = refresh_cache_async
+            self._metaschema_snapshot = MetaSchemaSnapshot(db_name, schema_name, host, port, cache_dir=cache_dir)
             self._dependencies = None
+            # structural join information, loaded from join_plan_file if it matches the catalog
+            self._join_plan: JoinPlan = None
+            self._catalog_fingerprint = None
+            self.join_plan_file = join_plan_file
             self._connection = None
+            self._pool: ConnectionPool = None
+            # intermediate result tables of the conversations, dropped after session_ttl seconds without access
+            self._result_tables = SessionResultTables(ttl=session_ttl)
+            self._result_rowcounts = {}
+            # in approximate mode the informativity of tables with more than max_exact_rows rows is estimated from the
+            # statistics or a sample of about sample_rows rows
+            self.informativity_mode = informativity_mode
+            self.max_exact_rows = 100000
+            self.sample_rows = 10000
+            # generated select queries are cached by their shape and executed as server side prepared statements
+            self._query_cache = QueryCache()
+            self.prepare_statements = True
+            # random column values are drawn in batches, columns with up to max_full_sample_rows rows are read at once
+            self._sample_pool = ColumnSamplePool(self.get_column_samples)
+            self.max_full_sample_rows = 10000
+            # base tables without planner statistics that were analyzed on demand
+            self._analyzed_tables = set()
+            # generator of all random choices and samples, seeded with set_random_seed for reproducible samples
+            self.rng = np.random.default_rng()
+            self.seeded = False
+            # string columns with up to max_fuzzy_cache_values distinct values are matched client side
+            self._distinct_values = {}
+            self.max_fuzzy_cache_values = 1000
+            # distinct values of base table columns, valid until the table is modified or the ttl expires
+            self._result_cache = ResultCache()
+            # resolved procedures by name and argument names
+            self._procedures = {}
+            # streamed selects fetch itersize rows per round trip from a named server side cursor
+            self.itersize = 2000
+            self._cursor_ids = count()
+            # latency statistics of all queries, queries slower than slow_query_threshold seconds are logged, with
+            # explain_slow_queries also with their EXPLAIN (ANALYZE, BUFFERS) plan, which runs the query a second time
+            self._query_stats = QueryStats()
+            self._query_hooks = []
+            self.slow_query_threshold = 1.0
+            self.explain_slow_queries = False
             PostgreSQLDatabase._instance = self
             self._connect(cache=cache)
 
     @staticmethod
-    def get_instance(db_name=None, schema_name=None, user=None, password=None, host=None, port=None):
+    def get_instance(db_name=None, schema_name=None, user=None, password=None, host=None, port=None, pool_size=1,
+                     session_ttl=3600, informativity_mode=INFORMATIVITY_EXACT, cache_dir=CACHE_DIR,
+                     refresh_cache_async=False, join_plan_file=None):
         if not PostgreSQLDatabase._instance:
             if not (db_name and schema_name and user and password and host and port):
                 raise Exception('Not all connection parameters specified, although no database instance is in place.')
-            PostgreSQLDatabase(db_name, schema_name, user, password, host, port)
+            PostgreSQLDatabase(db_name, schema_name, user, password, host, port, pool_size=pool_size,
+                               session_ttl=session_ttl, informativity_mode=informativity_mode, cache_dir=cache_dir,
+                               refresh_cache_async=refresh_cache_async, join_plan_file=join_plan_file)
         elif db_name and schema_name and user and password and host and port:
             logger.debug('Instance in place but parameters specified. Setting instance to new parameters')
             if PostgreSQLDatabase._instance._check_connection():
                 PostgreSQLDatabase._instance.disconnect()
             PostgreSQLDatabase._instance = None
-            PostgreSQLDatabase(db_name, schema_name, user, password, host, port)
+            PostgreSQLDatabase(db_name, schema_name, user, password, host, port, pool_size=pool_size,
+                               session_ttl=session_ttl, informativity_mode=informativity_mode, cache_dir=cache_dir,
+                               refresh_cache_async=refresh_cache_async, join_plan_file=join_plan_file)
         return PostgreSQLDatabase._instance
 
+    def _get_dsn(self):
+        return f"dbname={self.db_name} user={self.user} password={self.password} host={self.host} port={self.port} " \
+               f"options='-c search_path={self.schema_name}'"
+
+    @instrumented
     def _connect(self, cache=False):
         if not self._check_connection():
             try:
                 logger.debug(
                     f'Connecting to database postgres://{self.user}@{self.host}:{self.port}/{self.db_name}, schema: {self.schema_name}')
-                self._connection = pg.connect(
-                    f"dbname={self.db_name} user={self.user} password={self.password} host={self.host} port={self.port} options='-c search_path={self.schema_name}'",
-                    cursor_factory=RealDictCursor)
+                if self.pool_size and self.pool_size > 1:
+                    logger.debug(f'Using a connection pool with up to {self.pool_size} connections')
+                    self._pool = ConnectionPool(self._get_dsn(), min_connections=1, max_connections=self.pool_size,
+                                                connection_factory=StatementConnection, cursor_factory=RealDictCursor)
+                else:
+                    self._connection = pg.connect(self._get_dsn(), connection_factory=StatementConnection,
+                                                  cursor_factory=RealDictCursor)
                 schema = self.__query_one(
                     'SELECT nspname FROM pg_catalog.pg_namespace WHERE nspname=%(schema)s', {
                         'schema': self.schema_name
@@ -75,8 +176,10 @@ class PostgreSQLDatabase:
                     raise Exception(
                         f'Schema {self.schema_name} does not exist. Available Schemas:\n {", ".join(existing_schemas)}')
                 # todo remove, for convenience remove matches table on startup
-                self.__execute('DROP TABLE IF EXISTS matches;')
+                self.__execute(f'DROP TABLE IF EXISTS {RESULT_TABLE_PREFIX};')
+                self.__drop_stale_result_tables()
                 self.__generate_metaschema()
+                self.__build_join_plan()
                 if cache:
                     self.__build_informativity_cache()
             except pg.Error as e:
@@ -93,14 +196,19 @@ class PostgreSQLDatabase:
     def disconnect(self):
         if self._check_connection():
             logger.debug('Closing database connection.')
-            self._connection.close()
+            if self._pool:
+                self._pool.closeall()
+            else:
+                self._connection.close()
         else:
             logger.warning('No connection to close')
         self._connection = None
+        self._pool = None
 
     def get_metaschema(self):
         return self._metaschema
 
+    @instrumented
     def select(self,
                target_table_alias: str,
                additional_tables: List[str] = [],
@@ -108,7 +216,12 @@ class PostgreSQLDatabase:
                distinct_on_target=None,
                select_dict={},
                order: Tuple[any, str] = (1, 'ASC'),
-               limit: int = None) -> List[RealDictRow]:
+               limit: int = None,
+               offset: int = None,
+               compact: bool = False) -> Union[List[RealDictRow], CompactResult]:
+        """
+        :param compact: Return a CompactResult with tuple rows instead of dicts, also if limit is 1
+        """
 
         query, params = self._get_select_query(target_table_alias=target_table_alias,
                                                additional_tables=additional_tables,
@@ -117,38 +230,175 @@ class PostgreSQLDatabase:
                                                distinct_on_target=distinct_on_target,
                                                order=order)
 
+        # limit and offset are parameters, so all pages of a query share the same prepared statement
         if limit:
-            if limit == 1:
-                row = self.__query_one(query, params)
-                if row:
-                    return row
-                return None
-            return self.__query_many(query, params, limit)
-        return self.__query_all(query, params)
+            query += ' LIMIT %(limit)s'
+            params['limit'] = limit
+        if offset:
+            query += ' OFFSET %(offset)s'
+            params['offset'] = offset
+        if compact:
+            return self.__query_compact(query, params, prepare=True)
+        if limit == 1:
+            row = self.__run(query, params, lambda curs: curs.fetchone(), default={}, prepare=True)
+            if row:
+                return row
+            return None
+        return self.__run(query, params, lambda curs: curs.fetchall(), default=[], prepare=True)
+
+    @instrumented
+    def select_count(self,
+                     target_table_alias: str,
+                     additional_tables: List[str] = [],
+                     constraints: Dict[str, Dict[str, List[Dict[str, any]]]] = {},
+                     distinct_on_target=None,
+                     select_dict={}) -> int:
+        """Returns the number of rows select would return."""
+        query, params = self._get_select_query(target_table_alias=target_table_alias,
+                                               additional_tables=additional_tables,
+                                               constraints=constraints,
+                                               select_dict=select_dict,
+                                               distinct_on_target=distinct_on_target,
+                                               order=None)
+        row = self.__run(f'SELECT COUNT(*) AS count FROM ({query}) AS results', params,
+                         lambda curs: curs.fetchone(), default={}, prepare=True)
+        return row['count'] if row else 0
+
+    @instrumented
+    def select_iter(self,
+                    target_table_alias: str,
+                    additional_tables: List[str] = [],
+                    constraints: Dict[str, Dict[str, List[Dict[str, any]]]] = {},
+                    distinct_on_target=None,
+                    select_dict={},
+                    order: Tuple[any, str] = (1, 'ASC'),
+                    offset: int = None,
+                    itersize: int = None) -> Iterator[RealDictRow]:
+        """
+        Same as select without a limit, but streams the result from a named server side cursor, fetching itersize rows
+        at a time. A connection is held until the iterator is exhausted or closed, so close it if only a part of it is
+        consumed.
+        """
+        query, params = self._get_select_query(target_table_alias=target_table_alias,
+                                               additional_tables=additional_tables,
+                                               constraints=constraints,
+                                               select_dict=select_dict,
+                                               distinct_on_target=distinct_on_target,
+                                               order=order)
+        if offset:
+            query += ' OFFSET %(offset)s'
+            params['offset'] = offset
+        return self.__iterate(query, params, itersize=itersize, caller=get_caller())
 
+    @instrumented
     def select_into_table(self,
                           target_table_alias: str,
                           additional_tables: List[str] = [],
                           constraints={},
                           select_dict={},
                           distinct_on_target: str = None,
-                          result_table='matches',
+                          result_table=RESULT_TABLE_PREFIX,
                           order: Tuple[any, str] = None,
-                          analyze=False):
-        # drop current results
-        delete_temp = f'DROP TABLE IF EXISTS {result_table}'
-        self.__execute(delete_temp)
-        create_temp = f'CREATE UNLOGGED TABLE IF NOT EXISTS {result_table} AS '
-
-        query, params = self._get_select_query(target_table_alias, additional_tables, constraints, select_dict,
-                                               distinct_on_target, order)
-
-        create_temp += query
-        self.__execute(create_temp, params)
+                          analyze=False,
+                          session_id: str = None):
+        """
+        Stores the result of a select in an unlogged table.
+        :param session_id: If given, the result is stored in the result table of this session (e.g. the tracker sender
+        id) instead of result_table. If the previous result of the session has the same columns, the table is refilled
+        instead of recreated.
+        :return: The name of the result table
+        """
+        if session_id is not None:
+            self.__expire_result_tables()
+        result_table, fill_temp, query, params, recreate = self._get_select_into_table_query(
+            target_table_alias, additional_tables, constraints, select_dict, distinct_on_target, result_table, order,
+            session_id)
+        try:
+            # INSERT cannot execute a prepared statement, only CREATE TABLE AS can
+            rowcount = self.__run(query, params, lambda curs: curs.rowcount, commit=True, prepare=recreate,
+                                  prefix=fill_temp)
+        except pg.Error:
+            if session_id is not None:
+                self._result_tables.invalidate(session_id)
+            raise
+        self._result_rowcounts[result_table] = rowcount
         if analyze:
             self.__execute(f'ANALYZE {result_table}')
         return result_table
 
+    def _get_select_into_table_query(self, target_table_alias, additional_tables, constraints, select_dict,
+                                     distinct_on_target, result_table, order, session_id):
+        """
+        :return: The result table, the statement prefix that (re)creates or empties it, the select, its parameters
+        and whether the table is recreated (CREATE TABLE AS) instead of refilled (INSERT)
+        """
+        query, params = self._get_select_query(target_table_alias, additional_tables, constraints, select_dict,
+                                               distinct_on_target, order)
+        if session_id is not None:
+            result_table = self._result_tables.get(session_id).name
+            # the last fill tells other processes that the table is still in use
+            touch = f"INSERT INTO {self._result_tables.registry} VALUES ('{result_table}', now())" \
+                    f' ON CONFLICT (table_name) DO UPDATE SET last_access = now(); '
+            # the table can be refilled if the selected columns did not change
+            shape = query.split(' FROM ', 1)[0]
+            if self._result_tables.update(session_id, shape):
+                return result_table, f'{touch}TRUNCATE {result_table}; INSERT INTO {result_table} ', query, \
+                       params, False
+            return result_table, f'{touch}DROP TABLE IF EXISTS {result_table};' \
+                                 f' CREATE UNLOGGED TABLE {result_table} AS ', query, params, True
+        # drop current results
+        return result_table, f'DROP TABLE IF EXISTS {result_table}; CREATE UNLOGGED TABLE {result_table} AS ', \
+               query, params, True
+
+    def get_session_result_table(self, session_id: str) -> str:
+        """Returns the name of the intermediate result table of a session."""
+        return self._result_tables.get(session_id).name
+
+    @instrumented
+    def release_session_result_table(self, session_id: str):
+        """Drops the intermediate result table of a session, e.g. if the conversation is restarted."""
+        result_table = self._result_tables.release(session_id)
+        if result_table:
+            self._result_rowcounts.pop(result_table, None)
+            self.__execute(f'DROP TABLE IF EXISTS {result_table}')
+
+    def __expire_result_tables(self):
+        for result_table in self._pop_expired_result_tables():
+            self.__execute(f'DROP TABLE IF EXISTS {result_table}')
+
+    def _pop_expired_result_tables(self) -> List[str]:
+        """Forgets the result tables of expired sessions and returns them, the caller has to drop them."""
+        expired = self._result_tables.expire()
+        for result_table in expired:
+            logger.debug(f'Dropping expired result table {result_table}')
+            self._result_rowcounts.pop(result_table, None)
+        return expired
+
+    def __drop_stale_result_tables(self):
+        """
+        Drops the result tables of sessions that expired in any process sharing the schema, and tables that were
+        never registered (e.g. by previous versions). Tables of sessions that are still in use are kept.
+        """
+        registry = self._result_tables.registry
+        self.__execute(f'CREATE TABLE IF NOT EXISTS {registry}'
+                       f' (table_name TEXT PRIMARY KEY, last_access TIMESTAMPTZ NOT NULL)')
+        ttl = self._result_tables.ttl
+        expired = f" AND s.last_access > now() - {float(ttl)} * INTERVAL '1 second'" if ttl is not None else ''
+        rows = self.__query_all(
+            'SELECT tablename FROM pg_catalog.pg_tables t WHERE schemaname=%(schema)s AND tablename ~ %(pattern)s'
+            f' AND NOT EXISTS (SELECT 1 FROM {registry} s WHERE s.table_name = t.tablename{expired})', {
+                'schema': self.schema_name,
+                'pattern': f'^{RESULT_TABLE_PREFIX}_[0-9a-f]{{16}}$'
+            })
+        if rows:
+            logger.debug(f'Dropping {len(rows)} stale result tables')
+        for row in rows:
+            self.__execute(f'DROP TABLE IF EXISTS {row["tablename"]}')
+        self.__execute(f'DELETE FROM {registry} WHERE table_name NOT IN'
+                       ' (SELECT tablename FROM pg_catalog.pg_tables WHERE schemaname=%(schema)s)', {
+                           'schema': self.schema_name
+                       })
+
     def _get_select_query(self,
                           target_table_alias: str,
                           additional_tables: List[str] = [],
@@ -156,9 +406,24 @@ class PostgreSQLDatabase:
                           select_dict={},
                           distinct_on_target: str = None,
                           order: Tuple[any, str] = (1, 'ASC')) -> str:
+        constraints = CompiledConstraints.compile(constraints)
         # the tables to join are either ones that have constraints or are explicitly asked to join
-        constraint_tables = [table for table, column_constraints in constraints.items() if column_constraints]
-        join_aliases = list(set(constraint_tables).union(set(additional_tables)))
+        # sorted, so the join order (and the saved join plan) does not depend on the set order of the process
+        join_aliases = sorted(set(constraints.tables).union(set(additional_tables)))
+
+        select_constraint_where_conditions, params, param_num = self._get_where_conditions(constraints, {}, 0)
+
+        # the generated query only depends on the tables, the selected columns and the constraint operators
+        shape = (target_table_alias,
+                 frozenset(join_aliases),
+                 tuple([(table, tuple(columns)) for table, columns in select_dict.items()]),
+                 distinct_on_target,
+                 tuple(order) if order else None,
+                 select_constraint_where_conditions)
+        query = self._query_cache.get(shape)
+        if query is not None:
+            return query, params
+
         alias_to_table_name_dict = self._metaschema.get_alias_to_table_name_dict(
             set(join_aliases + [target_table_alias]))
         ordered_join_aliases = self._get_ordered_join_aliases(target_table_alias, join_aliases,
@@ -201,21 +466,19 @@ class PostgreSQLDatabase:
             )
 
         where_clause = 'WHERE 1=1 '
-
-        params = {}
-        param_num = 0
-
-        select_constraints = dict([(table_alias, constr) for table_alias, constr in constraints.items() if constr])
-        select_constraint_where_conditions, params, param_num = self._get_where_conditions(select_constraints, params,
-                                                                                           param_num)
-
         where_clause += select_constraint_where_conditions
 
         query = f'{select_clause} {from_clause} {where_clause}'
         if order:
             query += f" ORDER BY {order[0]} {order[1]} "
+        self._query_cache.put(shape, query)
+        logger.debug(f'Query cache miss, {self._query_cache.get_stats()}')
         return query, params
 
+    def get_query_cache_stats(self):
+        """Returns the hits and misses of the generated query cache."""
+        return self._query_cache.get_stats()
+
     def insert(self):
         raise NotImplementedError
 
@@ -225,9 +488,126 @@ class PostgreSQLDatabase:
     def delete(self):
         raise NotImplementedError
 
+    def _invalidate_caches(self):
+        # procedures may modify any table, and the statistics collector reports it with a delay
+        self._result_cache.invalidate()
+        self._distinct_values.clear()
+
+    @instrumented
     def call_procedure(self, name, operation, arguments):
+        proc = self._get_procedure(name, operation, arguments)
+        self._invalidate_caches()
+        proc_params = tuple([arguments[param_name] for param_name in proc.parameter_names()])
+        if self._check_connection():
+            start = time.perf_counter()
+            with self._get_connection() as connection:
+                with connection.cursor() as curs:
+                    try:
+                        if operation == OPERATION_SELECT:
+                            curs.callproc(name, proc_params)
+                            connection.commit()
+                            result = curs.fetchall(), None
+                        else:
+                            curs.execute(*self._get_call_query(proc, arguments))
+                            connection.commit()
+                            result = None, None
+                    except (errors.RaiseException, errors.InFailedSqlTransaction) as e:
+                        connection.rollback()
+                        return None, e.args[0].split('\n')[0]
+                    rows = curs.rowcount
+            self._record_query(*self._get_procedure_query(proc, operation, arguments), '',
+                               time.perf_counter() - start, rows, explain=False)
+            return result
+        raise Exception('No active connection to database')
+
+    @instrumented
+    def call_procedure_batch(self, name, operation, arguments_list: List[Dict[str, any]], page_size: int = 100) \
+            -> List[Tuple[any, str]]:
+        """
+        Calls a procedure once for every arguments dict (all with the same argument names). The procedure is resolved
+        once and the calls are sent in pages of page_size calls, each page in one transaction. If a call of a page
+        fails, the page is repeated call by call in savepoints, so only the failing calls are rolled back.
+        :return: The result and error of every call, like call_procedure
+        """
+        if not arguments_list:
+            return []
+        proc = self._get_procedure(name, operation, arguments_list[0])
+        self._invalidate_caches()
+        rows = [tuple([arguments[param_name] for param_name in proc.parameter_names()]) for arguments in arguments_list]
+        if not self._check_connection():
+            raise Exception('No active connection to database')
+        results = []
+        with self._get_connection() as connection:
+            with connection.cursor() as curs:
+                for start in range(0, len(rows), page_size):
+                    page = rows[start:start + page_size]
+                    try:
+                        page_results = self.__call_procedure_page(curs, proc, operation, page)
+                    except pg.DatabaseError as e:
+                        if isinstance(e, pg.OperationalError):
+                            raise
+                        connection.rollback()
+                        page_results = self.__call_procedure_rows(curs, proc, operation, page)
+                    connection.commit()
+                    results += page_results
+        return results
+
+    def __call_procedure_page(self, curs, proc: Procedure, operation, page: List[tuple]) -> List[Tuple[any, str]]:
+        if operation != OPERATION_SELECT:
+            execute_batch(curs, self.__get_batch_call_statement(proc), page, page_size=len(page))
+            return [(None, None)] * len(page)
+        # one statement calls the function for every row of the page, the row index groups the results
+        statement = self.__get_batch_select_statement(proc)
+        page_rows = execute_values(curs, statement, [(i,) + row for i, row in enumerate(page)],
+                                   page_size=len(page), fetch=True)
+        page_results = [[] for _ in page]
+        for row in page_rows:
+            i = row.pop('cat_row_index')
+            page_results[i].append(row)
+        return [(result, None) for result in page_results]
+
+    def __call_procedure_rows(self, curs, proc: Procedure, operation, page: List[tuple]) -> List[Tuple[any, str]]:
+        results = []
+        for row in page:
+            curs.execute('SAVEPOINT cat_batch_call')
+            try:
+                if operation == OPERATION_SELECT:
+                    curs.callproc(proc.name, row)
+                    results.append((curs.fetchall(), None))
+                else:
+                    curs.execute(self.__get_batch_call_statement(proc), row)
+                    results.append((None, None))
+                curs.execute('RELEASE SAVEPOINT cat_batch_call')
+            except pg.DatabaseError as e:
+                if isinstance(e, pg.OperationalError):
+                    raise
+                curs.execute('ROLLBACK TO SAVEPOINT cat_batch_call')
+                results.append((None, e.args[0].split('\n')[0]))
+        return results
+
+    @staticmethod
+    def __get_batch_call_statement(proc: Procedure) -> str:
+        return f'CALL {proc.name}(' + ', '.join(['%s'] * len(proc.parameters)) + ')'
+
+    @staticmethod
+    def __get_batch_select_statement(proc: Procedure) -> str:
+        # values lists are typed by their literals, so the arguments are cast to the parameter types
+        value_columns = ', '.join(['cat_row_index'] + [f'arg{i}' for i in range(len(proc.parameters))])
+        arguments = ', '.join([f'v.arg{i}::{parameter.data_type}{"[]" if parameter.is_list else ""}'
+                               for i, parameter in enumerate(proc.parameters)])
+        return f'SELECT v.cat_row_index, {proc.name}.* FROM (VALUES %s) AS v({value_columns})' \
+               f' CROSS JOIN LATERAL {proc.name}({arguments}) AS {proc.name}' \
+               f' ORDER BY v.cat_row_index'
+
+    def _get_procedure(self, name, operation, arguments) -> Procedure:
         if operation.lower() not in [OPERATION_SELECT, OPERATION_CALL]:
             raise Exception(f'No operation {operation} to call procedure {name}. Use "select" or "call"')
+        key = (name.lower(), frozenset([arg_name.lower() for arg_name in arguments.keys()]))
+        if key not in self._procedures:
+            self._procedures[key] = self.__find_procedure(name, arguments)
+        return self._procedures[key]
+
+    def __find_procedure(self, name, arguments) -> Procedure:
         arg_names = list(arguments.keys())
         matching_procs = [proc for proc in self._metaschema.procedures
                           if proc.name.lower() == name.lower()
@@ -237,30 +617,27 @@ class PostgreSQLDatabase:
                           ]
         if len(matching_procs) == 0:
             raise Exception(f'No stored procedure with name {name} and arguments {", ".join(arg_names)}')
-        proc = matching_procs[0]
-        proc_params = tuple([arguments[param_name] for param_name in proc.parameter_names()])
-        if self._check_connection():
-            with self._connection.cursor() as curs:
-                try:
-                    if operation == OPERATION_SELECT:
-                        curs.callproc(name, proc_params)
-                        self._connection.commit()
-                        result = curs.fetchall()
-                        return result, None
-                    else:
-                        query = f'CALL {proc.name}('
-                        query += ', '.join([f'%({param_name})s' for param_name in proc.parameter_names()])
-                        query += ')'
-                        params = dict([(param_name, arguments[param_name]) for param_name in proc.parameter_names()])
-                        curs.execute(query, params)
-                        self._connection.commit()
-                        return None, None
-                except (errors.RaiseException, errors.InFailedSqlTransaction) as e:
-                    self._connection.rollback()
-                    return None, e.args[0].split('\n')[0]
-        raise Exception('No active connection to database')
+        return matching_procs[0]
+
+    @staticmethod
+    def _get_procedure_query(proc: Procedure, operation, arguments) -> Tuple[str, Dict[str, any]]:
+        """Returns the statement a procedure call is recorded as in the query statistics."""
+        if operation != OPERATION_SELECT:
+            return PostgreSQLDatabase._get_call_query(proc, arguments)
+        query, params = PostgreSQLDatabase._get_call_query(proc, arguments)
+        return f'SELECT * FROM {query[len("CALL "):]}', params
 
+    @staticmethod
+    def _get_call_query(proc: Procedure, arguments) -> Tuple[str, Dict[str, any]]:
+        query = f'CALL {proc.name}('
+        query += ', '.join([f'%({param_name})s' for param_name in proc.parameter_names()])
+        query += ')'
+        params = dict([(param_name, arguments[param_name]) for param_name in proc.parameter_names()])
+        return query, params
+
+    @instrumented
     def should_join_next_table(self, target_table_name, joined_tables=[], constraints={}, requestable_columns={}):
+        constraints = CompiledConstraints.compile(constraints)
         # if we only have the target table, join with another table
         if len(joined_tables + [t for t, c in constraints.items() if c and t != target_table_name]) == 0:
             return True
@@ -283,13 +660,14 @@ class PostgreSQLDatabase:
             return True
         return False
 
+    @instrumented
     def get_best_join_table(self, target_table_name, joined_tables=[], constraints={}, requestable_columns={},
                             limit_check=None):
-
+        constraints = CompiledConstraints.compile(constraints)
         used_tables = list(set([target_table_name] +
                                joined_tables +
                                [table for table, column_constr in self.get_real_constraints(constraints).items()]))
-        join_candidates = self._dependencies.get_join_candidates(used_tables, self._metaschema.mapping_tables)
+        join_candidates = self._join_plan.get_join_candidates(used_tables)
 
         informativity_table = {}
         # do not join if our result is not limited at all
@@ -307,39 +685,227 @@ class PostgreSQLDatabase:
         if limit_check:
             join_candidates = join_candidates[:min(limit_check, len(join_candidates))]
 
-        for candidate in join_candidates:
-            new_join_tables = joined_tables + [candidate]
-            result_table_name = f'joined_{candidate}'
-            select_columns = {
-                candidate: requestable_columns[candidate]
-            }
-            logger.debug(f'Checking join selectivity on table {candidate}')
-            self.select_into_table(target_table_name, new_join_tables, constraints=constraints,
-                                   result_table=result_table_name, select_dict=select_columns)
-            informativity_columns = [f'{candidate}__{column}' for column in requestable_columns[candidate]]
-            informativity_table.update(self.get_column_entropies(result_table_name, informativity_columns))
-            self.__execute(f'DROP TABLE IF EXISTS {result_table_name}')
-        # return the table name with the highest informativity
+        if self.informativity_mode == INFORMATIVITY_APPROXIMATE:
+            informativity_table = self.get_approximate_join_candidate_entropies(target_table_name, join_candidates,
+                                                                                joined_tables, constraints,
+                                                                                requestable_columns)
+        else:
+            informativity_table = self.get_join_candidate_entropies(target_table_name, join_candidates, joined_tables,
+                                                                    constraints, requestable_columns)
+        # return the table name with the highest informativity, empty joins have no informativity
+        informativity_table = dict([(slot, inf) for slot, inf in informativity_table.items() if inf is not None])
         if informativity_table:
             best_slot, informativity = max(informativity_table.items(), key=lambda pair: pair[1])
             best_table, best_column = slot_to_table_column_with_fk(best_slot)
             return best_table
         return None
 
+    @instrumented
+    def get_join_candidate_entropies(self, target_table_name, join_candidates, joined_tables=[], constraints={},
+                                     requestable_columns={}):
+        """
+        Computes the entropies of the requestable columns of every join candidate directly over the joins, without
+        materializing the joined results. With a connection pool the candidates are evaluated concurrently, otherwise
+        all candidates are evaluated in a single query.
+        :return: A dict with the normalized entropy per slot of all candidates
+        """
+        candidate_queries = []
+        for candidate in join_candidates:
+            select_columns = {
+                candidate: requestable_columns[candidate]
+            }
+            query, params = self._get_select_query(target_table_name, joined_tables + [candidate],
+                                                   constraints=constraints, select_dict=select_columns, order=None)
+            columns = list(dict.fromkeys([f'{candidate}__{column}' for column in requestable_columns[candidate]]))
+            if columns:
+                candidate_queries.append((query, params, columns))
+        if not candidate_queries:
+            return {}
+
+        informativity_table = {}
+        if self._pool and len(candidate_queries) > 1:
+            logger.debug(f'Checking join selectivity of {len(candidate_queries)} candidates concurrently')
+            # the queries of the worker threads are attributed to the caller of this thread
+            get_entropies = with_caller(get_caller(), self.__get_entropies)
+            with ThreadPoolExecutor(max_workers=min(self.pool_size, len(candidate_queries))) as executor:
+                futures = [executor.submit(get_entropies, f'({query}) candidate', columns, params)
+                           for query, params, columns in candidate_queries]
+                for future in futures:
+                    informativity_table.update(future.result())
+            return informativity_table
+
+        # all candidates share the same constraints and thus the same parameters
+        params = candidate_queries[0][1]
+        if any([candidate_params != params for _, candidate_params, _ in candidate_queries]):
+            for query, candidate_params, columns in candidate_queries:
+                informativity_table.update(self.__get_entropies(f'({query}) candidate', columns, candidate_params))
+            return informativity_table
+        logger.debug(f'Checking join selectivity of {len(candidate_queries)} candidates in a single query')
+        with_clause = ', '.join([f'c{i} AS ({query})' for i, (query, _, _) in enumerate(candidate_queries)])
+        union_queries = []
+        for i, (_, _, columns) in enumerate(candidate_queries):
+            entropy_query = self._get_entropy_query(f'c{i}', columns)
+            union_queries.append(f'SELECT {i} AS candidate_index, column_index, entropy FROM ({entropy_query}) e{i}')
+        union_query = ' UNION ALL '.join(union_queries)
+        for _, _, columns in candidate_queries:
+            informativity_table.update([(column, None) for column in columns])
+        for candidate_index, column_index, entropy in self.__query_compact(f'WITH {with_clause} {union_query}', params):
+            columns = candidate_queries[candidate_index][2]
+            informativity_table[columns[column_index]] = entropy
+        return informativity_table
+
+    @instrumented
+    def get_approximate_join_candidate_entropies(self, target_table_name, join_candidates, joined_tables=[],
+                                                 constraints={}, requestable_columns={}):
+        """
+        Estimates the entropies of the requestable columns of every join candidate from the planner statistics of the
+        candidate table and the size of the join, which is counted without materializing the joined result. Candidates
+        without statistics are computed exactly.
+        :return: A dict with the normalized entropy per slot of all candidates
+        """
+        informativity_table = {}
+        exact_candidates = []
+        for candidate in join_candidates:
+            candidate_table = table_with_fk_to_table(candidate)
+            columns = list(dict.fromkeys(requestable_columns[candidate]))
+            if not columns:
+                continue
+            table_rows = self.get_estimated_rowcount(candidate_table, analyze=True)
+            statistics = self.get_column_statistics(candidate_table, columns) if table_rows else []
+            if len(statistics) < len(columns):
+                exact_candidates.append(candidate)
+                continue
+            query, params = self._get_select_query(target_table_name, joined_tables + [candidate],
+                                                   constraints=constraints, select_dict={candidate: columns},
+                                                   order=None)
+            logger.debug(f'Estimating join selectivity on table {candidate}')
+            join_rows = self.__query_one(f'SELECT COUNT(*) AS count FROM ({query}) candidate', params)['count']
+            for stats in statistics:
+                slot = f'{candidate}__{stats["attname"]}'
+                if not join_rows:
+                    # empty joins have no informativity
+                    informativity_table[slot] = None
+                    continue
+                # the joined result can not have more distinct values than rows
+                n_distinct = stats['n_distinct']
+                distinct = -n_distinct * table_rows if n_distinct < 0 else n_distinct
+                informativity_table[slot] = estimate_normalized_entropy(stats['null_frac'],
+                                                                        min(distinct, join_rows),
+                                                                        stats['most_common_freqs'], join_rows)
+        if exact_candidates:
+            informativity_table.update(self.get_join_candidate_entropies(target_table_name, exact_candidates,
+                                                                         joined_tables, constraints,
+                                                                         requestable_columns))
+        return informativity_table
+
     def get_join_tables(self, table_name, directed=True):
-        return self._dependencies.get_join_candidates([table_name], self._metaschema.mapping_tables, directed=directed)
+        return self._join_plan.get_join_candidates([table_name], directed=directed)
 
-    def get_column_entropies(self, table_name, columns):
+    @instrumented
+    def get_column_informativities(self, table_name, columns):
+        """
+        Returns the informativity (normalized entropy) of the given columns. Depending on the informativity mode and
+        the size of the table it is either computed exactly or estimated.
+        """
+        if self.informativity_mode != INFORMATIVITY_APPROXIMATE:
+            return self.get_column_entropies(table_name, columns)
+        rows = self.get_estimated_rowcount(table_name, analyze=True)
+        if rows is None or rows <= self.max_exact_rows:
+            return self.get_column_entropies(table_name, columns)
+        return self.get_approximate_column_entropies(table_name, columns, rows)
+
+    def get_approximate_column_entropies(self, table_name, columns, rows):
+        """
+        Estimates the normalized entropy of the given columns. Base tables use the planner statistics in pg_stats,
+        columns without statistics (e.g. of intermediate results) are computed on a sample of about sample_rows rows.
+        """
         entropy_table = {}
-        for column in columns:
-            params = {
-                'tablename': table_name,
-                'attname': column
-            }
-            row = self.__query_one('SELECT public.normalized_entropy(%(tablename)s, %(attname)s)', params)
-            entropy_table[column] = row['normalized_entropy']
+        if self._metaschema and table_name in [table.name for table in self._metaschema.tables]:
+            for stats in self.get_column_statistics(table_name, columns):
+                entropy_table[stats['attname']] = estimate_normalized_entropy(stats['null_frac'], stats['n_distinct'],
+                                                                              stats['most_common_freqs'], rows)
+        sample_columns = [column for column in columns if column not in entropy_table]
+        if sample_columns:
+            percent = min(100.0, 100.0 * self.sample_rows / rows)
+            logger.debug(f'Estimating informativity of {table_name} on a {percent:.2f}% sample')
+            entropy_table.update(self.__get_entropies(f'{table_name} TABLESAMPLE SYSTEM ({percent})'
+                                                      f'{self.__get_repeatable()}', sample_columns))
+        return entropy_table
+
+    def get_column_statistics(self, table_name, columns):
+        query = 'SELECT attname, null_frac, n_distinct, most_common_freqs' \
+                ' FROM pg_catalog.pg_stats' \
+                ' WHERE schemaname = %(schema)s AND tablename = %(table)s AND attname IN %(columns)s'
+        params = {
+            'schema': self.schema_name,
+            'table': table_name,
+            'columns': tuple(columns)
+        }
+        return self.__query_all(query, params)
+
+    def get_estimated_rowcount(self, table_name, analyze=False):
+        """
+        Returns the number of rows of an intermediate result table or the planner estimate for other tables. None if
+        there is no estimate yet.
+        :param analyze: Analyze a base table without an estimate (e.g. after loading data), once per table
+        """
+        if table_name in self._result_rowcounts:
+            return self._result_rowcounts[table_name]
+        rows = self.__get_reltuples(table_name)
+        if rows is None and analyze and table_name not in self._analyzed_tables and self._metaschema and \
+                table_name in [table.name for table in self._metaschema.tables]:
+            logger.info(f'Table {table_name} has no planner statistics, analyzing it')
+            self._analyzed_tables.add(table_name)
+            self.__execute(f'ANALYZE {table_name}')
+            rows = self.__get_reltuples(table_name)
+        if rows is None and analyze:
+            logger.info(f'No row estimate for {table_name}, falling back to exact computation')
+        return rows
+
+    def __get_reltuples(self, table_name):
+        row = self.__query_one('SELECT reltuples FROM pg_catalog.pg_class WHERE oid = to_regclass(%(table)s)', {
+            'table': f'{self.schema_name}.{table_name}'
+        })
+        if not row or row['reltuples'] <= 0:
+            return None
+        return row['reltuples']
+
+    @instrumented
+    def get_column_entropies(self, table_name, columns):
+        """
+        Computes the normalized entropy of all given columns with a single scan of the table. Equivalent to calling
+        public.normalized_entropy for every column.
+        :return: A dict with the normalized entropy per column, None if the table is empty
+        """
+        return self.__get_entropies(table_name, columns)
+
+    def __get_entropies(self, from_item, columns, params={}):
+        columns = list(dict.fromkeys(columns))
+        if not columns:
+            return {}
+        entropy_table = dict([(column, None) for column in columns])
+        for column_index, entropy in self.__query_compact(self._get_entropy_query(from_item, columns), params):
+            entropy_table[columns[column_index]] = entropy
         return entropy_table
 
+    @staticmethod
+    def _get_entropy_query(from_item, columns):
+        column_index = ' '.join([f'WHEN GROUPING({column}) = 0 THEN {i}' for i, column in enumerate(columns)])
+        grouping_sets = ', '.join([f'({column})' for column in columns])
+        # one grouping set per column, GROUPING() tells which column a frequency row belongs to
+        frequencies_query = f'SELECT CASE {column_index} END AS column_index, COUNT(*) AS frequency' \
+                            f' FROM {from_item}' \
+                            f' GROUP BY GROUPING SETS ({grouping_sets})'
+        probabilities_query = f'SELECT column_index,' \
+                              f' frequency::NUMERIC / SUM(frequency) OVER (PARTITION BY column_index) AS probability' \
+                              f' FROM ({frequencies_query}) frequencies'
+        query = f'SELECT column_index,' \
+                f' SUM(probability * LOG(2, 1 / probability)) / COALESCE(NULLIF(LOG(2, COUNT(*)), 0), 1) AS entropy' \
+                f' FROM ({probabilities_query}) probabilities' \
+                f' GROUP BY column_index'
+        return query
+
+    @instrumented
     def get_column_selectivities(self, table_name, candidate, requestable_columns):
         query = f'SELECT attname AS table_column, n_distinct AS selectivity FROM pg_stats \
         WHERE tablename = %(join_table)s AND attname IN %(attributes)s'
@@ -360,8 +926,22 @@ class PostgreSQLDatabase:
         return None
 
     def _get_ordered_join_aliases(self, target_table_alias, join_aliases, alias_to_table_name_dict):
-        join_paths = [self._dependencies.get_best_dependency_path(target_table_alias, alias_to_table_name_dict[t]) for t
-                      in join_aliases]
+        key = (target_table_alias, tuple(sorted(join_aliases)))
+        ordered_join_aliases = self._join_plan.ordered_aliases.get(key)
+        if ordered_join_aliases is not None:
+            # aliases on the join paths are added like below
+            for alias in ordered_join_aliases:
+                if alias not in alias_to_table_name_dict.keys():
+                    alias_to_table_name_dict.update({alias: self._metaschema.get_alias_table(alias)})
+                    join_aliases.append(alias)
+            return list(ordered_join_aliases)
+        ordered_join_aliases = self.__get_ordered_join_aliases(target_table_alias, join_aliases,
+                                                               alias_to_table_name_dict)
+        self._join_plan.ordered_aliases[key] = list(ordered_join_aliases)
+        return ordered_join_aliases
+
+    def __get_ordered_join_aliases(self, target_table_alias, join_aliases, alias_to_table_name_dict):
+        join_paths = [self._join_plan.get_path(target_table_alias, alias_to_table_name_dict[t]) for t in join_aliases]
         ordered_join_aliases = []
         for alias, path in zip(join_aliases, join_paths):
             prefix = table_with_fk_to_fk(alias)
@@ -381,6 +961,14 @@ class PostgreSQLDatabase:
         return ordered_join_aliases
 
     def _get_from_clause(self, ordered_join_aliases: List[str], tables_dict: Dict[str, Table]):
+        key = tuple(ordered_join_aliases)
+        if key not in self._join_plan.from_clauses:
+            from_clause, successfully_joined = self.__get_from_clause(ordered_join_aliases, tables_dict)
+            self._join_plan.from_clauses[key] = (from_clause, successfully_joined)
+        from_clause, successfully_joined = self._join_plan.from_clauses[key]
+        return from_clause, list(successfully_joined)
+
+    def __get_from_clause(self, ordered_join_aliases: List[str], tables_dict: Dict[str, Table]):
         from_clause = 'FROM '
         fact_aliases = []
         successfully_joined = []
@@ -466,10 +1054,36 @@ class PostgreSQLDatabase:
         join_clause += f' ON {dim_alias}.{join_column.column_reference} = {fact_alias}.{join_column.name}'
         return join_clause
 
+    @instrumented
     def select_all(self, table_name='matches'):
         return self.__query_all(f'SELECT * FROM {table_name}')
 
-    def select_distinct(self, table_name: str, column_name: str, count=False, limit: int = None):
+    @instrumented
+    def select_distinct(self, table_name: str, column_name: str, count=False, limit: int = None, compact=False,
+                        offset: int = None, prefix: str = None):
+        """
+        Selects (or counts) the distinct values of a column. Results on base tables are cached until the table is
+        modified.
+        :param offset: Skip the first offset values, the values are ordered if a limit or an offset is given, so
+        consecutive pages do not overlap
+        :param prefix: Only select values starting with prefix (case insensitive)
+        """
+        query, params = self._get_select_distinct_query(table_name, column_name, count, limit, offset, prefix)
+        # intermediate results change with every turn, only base tables are cached
+        if not self._is_base_table(table_name):
+            return self.__select_distinct(query, params, limit, compact)
+        key = (query, tuple(sorted(params.items())), limit, compact)
+        version = self.__get_table_version(table_name)
+        result = self._result_cache.get(table_name, key, version)
+        if result is None:
+            result = self.__select_distinct(query, params, limit, compact)
+            self._result_cache.put(table_name, key, version, result)
+        return result
+
+    @staticmethod
+    def _get_select_distinct_query(table_name: str, column_name: str, count=False, limit: int = None,
+                                   offset: int = None, prefix: str = None) -> Tuple[str, Dict[str, any]]:
+        params = {}
         query = f'SELECT '
         if count:
             query += 'COUNT('
@@ -477,15 +1091,39 @@ class PostgreSQLDatabase:
         if count:
             query += ')'
         query += f' FROM {table_name}'
+        if prefix:
+            query += f' WHERE {column_name}::TEXT ILIKE %(prefix)s'
+            params['prefix'] = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        if not count:
+            if offset or (limit and limit > 0):
+                query += f' ORDER BY {column_name}'
+            if offset:
+                query += f' OFFSET {int(offset)}'
+            if limit and limit > 0:
+                query += f' LIMIT {int(limit)}'
+        return query, params
+
+    def _is_base_table(self, table_name: str) -> bool:
+        return bool(self._metaschema) and table_name in [table.name for table in self._metaschema.tables]
+
+    def __select_distinct(self, query, params, limit, compact):
+        if compact:
+            return self.__query_compact(query, params)
         if limit and limit > 0:
             if limit == 1:
-                return self.__query_one(query)
+                return self.__query_one(query, params)
             else:
-                return self.__query_many(query)
-        return self.__query_all(query)
+                return self.__query_many(query, params, num=limit)
+        return self.__query_all(query, params)
+
+    def get_result_cache_stats(self):
+        """Returns the hits and misses of the distinct value cache."""
+        return self._result_cache.get_stats()
 
+    @instrumented
     def get_next_slot(self, target_table, joined_tables=[], constraints={}, requestable_columns={},
                       result_table='matches', as_table_column=False):
+        constraints = CompiledConstraints.compile(constraints)
         requestable_tables = list(set(
             [target_table] + joined_tables + [table for table, column_constr in constraints.items() if column_constr]))
         known_columns = [f'{table}__{column}' for table, column_constr in constraints.items() for column in
@@ -507,14 +1145,14 @@ class PostgreSQLDatabase:
                  if column_to_slot(table, c) in column_options]
             )
         else:
-            informativity_table = self.get_column_entropies(result_table, column_options)
+            informativity_table = self.get_column_informativities(result_table, column_options)
         if not informativity_table:
             logger.debug('Informativity table is empty')
             return (None, None) if as_table_column else None
         best_informativity = max(informativity_table.values())
         best_slots = [slot for slot, informativity in informativity_table.items() if
                       informativity == best_informativity]
-        next_slot = random.choice(best_slots)
+        next_slot = best_slots[int(self.rng.integers(len(best_slots)))]
         if not next_slot:
             logger.debug('No next slot found')
             return (None, None) if as_table_column else None
@@ -527,11 +1165,17 @@ class PostgreSQLDatabase:
 
     @staticmethod
     def get_real_constraints(constraints):
-        return dict([(table, column_constr) for table, column_constr in constraints.items()
-                     if column_constr and
-                     any([is_value(val) for col, constrs in column_constr.items()
-                          for constr in constrs
-                          for val in constr['values']])])
+        if isinstance(constraints, CompiledConstraints):
+            return constraints.real_constraints
+        return get_real_constraints(constraints)
+
+    @staticmethod
+    def compile_constraints(constraints) -> CompiledConstraints:
+        """
+        Compiles a constraints dict, the result can be passed to all methods that take constraints. Compile the
+        constraints once whenever they change instead of passing the dict to several calls.
+        """
+        return CompiledConstraints.compile(constraints)
 
     @staticmethod
     def build_constraint(values: List[any], operator: str = OPERATOR_EQUAL, is_reference: bool = False):
@@ -549,46 +1193,76 @@ class PostgreSQLDatabase:
 
     @staticmethod
     def _get_where_conditions(constraints, params={}, param_num=0):
-        where_clause = ''
-        filtered_constraints = dict([(table, col_constr) for table, col_constr in constraints.items() if col_constr])
-        for table_alias, column_constraints in filtered_constraints.items():
-            for column_name, col_constraints in column_constraints.items():
-                for c in col_constraints:
-                    values = c['values']
-                    operator = c['operator']
-                    # skip dont care conditions
-                    if len(values) == 1 and values[0] == DONT_CARE:
-                        continue
-                    where_clause += f" AND {table_alias}.{column_name} {operator} "
-                    param_name = f'param{param_num}'
-                    if operator == OPERATOR_IN or len(values) > 1:
-                        params[param_name] = tuple(values)
-                    elif len(values) > 1:
-                        params[param_name] = values
-                    else:
-                        params[param_name] = values[0]
-                    param_num += 1
-                    where_clause += f'%({param_name})s'
-        return where_clause, params, param_num
+        if isinstance(constraints, CompiledConstraints) and param_num == 0:
+            params.update(constraints.params)
+            return constraints.where_clause, params, constraints.param_count
+        return get_where_conditions(constraints, params, param_num)
 
+    @instrumented
     def get_similar_string_values(self, table: str, column: str, value: str, gt_threshold: float = 0):
-        max_query = f'(SELECT max(public.SIMILARITY({column}, %(value)s)) AS max_sim FROM {table}' \
-                    f' WHERE public.SIMILARITY({column}, %(value)s::TEXT) > %(gt_threshold)s) max_sims'
-
-        query = f'SELECT ' \
-                f'{column}, public.SIMILARITY({column}, %(value)s) AS similarity' \
-                f' FROM {table}' \
-                f' INNER JOIN {max_query}' \
-                f' ON public.SIMILARITY({column}, %(value)s) = max_sim' \
-                f' GROUP BY {column}'
+        """
+        Returns the distinct values of a column with the highest trigram similarity to value, if it is greater than
+        gt_threshold. Columns with few distinct values are matched client side, otherwise the trigram operator is used,
+        which can use a trigram index on the column (see create_trigram_indexes).
+        :return: The most similar values and their similarity, None and 0 if no value is similar enough
+        """
+        distinct_values = self.__get_cached_distinct_values(table, column)
+        if distinct_values is not None:
+            return get_most_similar(distinct_values, value, gt_threshold)
+        query, params = self._get_similar_string_values_query(table, column, value, gt_threshold)
+        return self._get_similar_string_values_result(self.__query_compact(query, params), column)
+
+    @staticmethod
+    def _get_similar_string_values_query(table: str, column: str, value: str, gt_threshold: float):
+        # the % operator filters by pg_trgm.similarity_threshold, the similarity is computed once per value
+        candidates_query = f'SELECT DISTINCT {column}, public.SIMILARITY({column}, %(value)s::TEXT) AS similarity' \
+                           f' FROM {table}' \
+                           f' WHERE {column} OPERATOR(public.%%) %(value)s::TEXT'
+        query = f"SELECT set_config('pg_trgm.similarity_threshold', %(threshold)s, true);" \
+                f' WITH candidates AS ({candidates_query})' \
+                f' SELECT {column}, similarity FROM candidates' \
+                f' WHERE similarity > %(gt_threshold)s AND similarity = (SELECT max(similarity) FROM candidates)'
         params = {
             'value': value,
-            'gt_threshold': gt_threshold
+            'gt_threshold': gt_threshold,
+            'threshold': str(max(0.0, min(1.0, gt_threshold)))
         }
-        result = self.__query_all(query, params)
+        return query, params
+
+    @staticmethod
+    def _get_similar_string_values_result(result: CompactResult, column: str):
         if len(result) == 0:
             return None, 0
-        return [row[column] for row in result], result[0]['similarity']
+        return result.column(column), result.get(result[0], 'similarity')
+
+    def __get_cached_distinct_values(self, table: str, column: str):
+        if (table, column) not in self._distinct_values:
+            values = self.__query_compact(self._get_distinct_values_query(table, column)).column(column)
+            self._cache_distinct_values(table, column, values)
+        return self._distinct_values[(table, column)]
+
+    def _get_distinct_values_query(self, table: str, column: str) -> str:
+        return f'SELECT DISTINCT {column} FROM {table} WHERE {column} NOTNULL' \
+               f' LIMIT {int(self.max_fuzzy_cache_values) + 1}'
+
+    def _cache_distinct_values(self, table: str, column: str, values: List[any]):
+        # None if the column has too many distinct values to match them client side
+        self._distinct_values[(table, column)] = values if len(values) <= self.max_fuzzy_cache_values else None
+
+    @instrumented
+    def create_trigram_indexes(self, columns: Dict[str, List[str]]):
+        """
+        Creates GIN trigram indexes (pg_trgm) for the given string columns, which speed up get_similar_string_values.
+        :param columns: The columns to index per table
+        """
+        for table, table_columns in columns.items():
+            for column in table_columns:
+                index_name = f'{table}_{column}_trgm_idx'
+                if len(index_name) > 63:
+                    index_name = f'trgm_idx_{hashlib.md5(index_name.encode("utf-8")).hexdigest()[:16]}'
+                logger.debug(f'Creating trigram index on {table}.{column}')
+                self.__execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table}'
+                               f' USING gin ({column} public.gin_trgm_ops)')
 
     def get_column_type(self, table_name, column_name):
         table_matches = list(filter(lambda t: t.name == table_name, self._metaschema.tables))
@@ -621,16 +1295,78 @@ class PostgreSQLDatabase:
             return 'datetime'
         return 'string'  # default
 
-    def get_sample(self, table_names, column_names={}, constraints={}):
-        if isinstance(table_names, str):
-            column_names = {table_names: [column_names] if isinstance(column_names, str) else column_names}
-            table_names = [table_names]
-        return self.select(table_names, column_names, constraints, order=('random()', 'ASC'), limit=1)
+    def get_sample(self, table_name, column_names=[], constraints={}):
+        """
+        Returns a random row of a table that matches the constraints, None if there is none. A single column without
+        constraints is taken from the sample pool, other rows are read at an offset drawn from the seeded generator
+        instead of ordering the whole table by random().
+        """
+        if isinstance(column_names, str):
+            if not constraints:
+                return self.get_column_sample(table_name, column_names)
+            column_names = [column_names]
+        select_dict = {table_name: column_names} if column_names else {}
+        count = self.select_count(table_name, constraints=constraints, select_dict=select_dict)
+        if not count:
+            return None
+        return self.select(table_name, constraints=constraints, select_dict=select_dict, limit=1,
+                           offset=int(self.rng.integers(count)))
 
     def get_column_sample(self, table_name, column_name):
-        return self.__query_one(
-            f'SELECT {column_name} FROM {table_name} WHERE {column_name} NOTNULL ORDER BY random() LIMIT 1')
+        """
+        Returns a random non null value of a column as a dict, None if the column has no values. Values are taken from
+        an in-memory pool, which is refilled in batches.
+        """
+        value = self._sample_pool.get(table_name, column_name)
+        if value is None:
+            return None
+        return {column_name: value}
+
+    @instrumented
+    def get_column_samples(self, table_name, column_name, n):
+        """
+        Draws n random non null values of a column (with replacement), so the values keep the frequencies of the
+        column. Small tables are read completely, larger ones are sampled with TABLESAMPLE BERNOULLI. Without a row
+        estimate at most max_full_sample_rows rows are read.
+        """
+        rows = self.get_estimated_rowcount(table_name, analyze=True)
+        if rows is None:
+            query = f'SELECT {column_name} FROM {table_name} WHERE {column_name} NOTNULL' \
+                    f' LIMIT {int(self.max_full_sample_rows)}'
+        elif rows <= self.max_full_sample_rows:
+            query = f'SELECT {column_name} FROM {table_name} WHERE {column_name} NOTNULL'
+        else:
+            # oversample, as some of the sampled rows may be null
+            percent = min(100.0, 100.0 * 2 * max(n, self.max_full_sample_rows // 10) / rows)
+            query = f'SELECT {column_name} FROM {table_name} TABLESAMPLE BERNOULLI ({percent})' \
+                    f'{self.__get_repeatable()} WHERE {column_name} NOTNULL'
+        values = self.__query_compact(query).column(column_name)
+        if not values:
+            # the sample of a sparse column may be empty
+            order = f"md5({column_name}::text || '{self.__get_sample_seed()}')" if self.seeded else 'random()'
+            values = self.__query_compact(f'SELECT {column_name} FROM {table_name} WHERE {column_name} NOTNULL'
+                                          f' ORDER BY {order} LIMIT {int(n)}').column(column_name)
+        if not values:
+            return []
+        return [values[i] for i in self.rng.integers(0, len(values), n)]
+
+    def set_random_seed(self, seed):
+        """
+        Makes the random choices and samples reproducible. Every table sample of the database is drawn with a seed
+        (REPEATABLE) from the seeded generator, so the same seed draws the same values for an unchanged table.
+        :param seed: An int, a numpy SeedSequence or None for an unseeded generator
+        """
+        self.rng = np.random.default_rng(seed)
+        self.seeded = seed is not None
+        self._sample_pool.clear()
+
+    def __get_sample_seed(self) -> int:
+        return int(self.rng.integers(2 ** 31))
+
+    def __get_repeatable(self) -> str:
+        return f' REPEATABLE ({self.__get_sample_seed()})' if self.seeded else ''
 
+    @instrumented
     def can_cast_datatype(self, value, datatype) -> bool:
         params = {
             'value': value
@@ -645,47 +1381,173 @@ class PostgreSQLDatabase:
             return False
 
     def _check_connection(self):
+        if self._pool:
+            return not self._pool.closed
         return self._connection and not self._connection.closed
 
-    def __query_one(self, sql, data={}):
-        if self._check_connection():
-
-            with self._connection.cursor() as curs:
-                curs.execute(sql, data)
-                return curs.fetchone()
+    @contextmanager
+    def _get_connection(self):
+        """
+        Yields a connection to run statements on. In pooled mode the connection is checked out for the duration of the
+        context and returned afterwards (broken connections are discarded), otherwise the shared connection is used.
+        """
+        if self._pool:
+            with self._pool.connection() as connection:
+                yield connection
         else:
+            yield self._connection
+
+    def __run(self, sql: str, data, fetch=None, commit=False, default=None, prepare=False, prefix='', compact=False,
+              instrument=True):
+        """
+        Executes prefix + sql on a connection.
+        :param prepare: Execute sql, which has to be a select, as a server side prepared statement
+        :param compact: Use a plain tuple cursor instead of the dict cursor of the connection
+        :param instrument: Record the latency of the query and call the query hooks
+        """
+        if not self._check_connection():
             logger.error('Could not execute query. Not database connection established.')
-            return {}
+            return default
+        # tuples are rendered as value lists, which cannot be bound to a statement parameter
+        prepare = prepare and self.prepare_statements and not any([isinstance(v, tuple) for v in data.values()])
+        retry = self._pool is not None
+        start = time.perf_counter()
+        while True:
+            with self._get_connection() as connection:
+                try:
+                    with connection.cursor(cursor_factory=pgx.cursor if compact else None) as curs:
+                        if prepare and hasattr(connection, 'prepared_statements'):
+                            curs.execute(prefix + self.__get_prepared_statement(connection, curs, sql), data)
+                        else:
+                            curs.execute(prefix + sql, data)
+                        result = fetch(curs) if fetch else None
+                        rows = curs.rowcount
+                    if commit:
+                        connection.commit()
+                    break
+                except (pg.OperationalError, pg.InterfaceError):
+                    # the pool replaces broken connections, so retry once on a fresh one
+                    if not retry or not connection.closed:
+                        raise
+                    logger.warning('Lost database connection, retrying on a new connection')
+                    retry = False
+        if instrument:
+            # recorded after the connection was released, explaining a slow query needs one as well
+            self._record_query(sql, data, prefix, time.perf_counter() - start, rows)
+        return result
+
+    def _record_query(self, sql: str, data, prefix: str, duration: float, rows: int, caller: str = None,
+                      explain=True):
+        """
+        Records an executed query in the query statistics, calls the query hooks and logs it if it was slow.
+        :param caller: The calling database method, by default the one of the current thread
+        :param explain: Whether a slow query may be explained, i.e. executed again
+        """
+        caller = caller or get_caller()
+        slow = self.slow_query_threshold is not None and duration >= self.slow_query_threshold
+        self._query_stats.record(prefix + sql, caller, duration, rows, slow=slow)
+        for hook in self._query_hooks:
+            try:
+                hook(prefix + sql, data, caller, duration, rows)
+            except Exception as e:
+                logger.warning(f'Query hook {hook} failed: {e}')
+        if slow:
+            # statements with a prefix create or fill tables, they must not run twice
+            plan = self.__explain(sql, data) if self.explain_slow_queries and explain and not prefix else None
+            slow_query_logger.warning(f'Slow query in {caller} ({duration:.3f}s, {rows} rows): {prefix + sql}'
+                                      + (f'\n{plan}' if plan else ''))
+
+    def __explain(self, sql: str, data):
+        # only single selects can be explained
+        statement = sql.strip().rstrip(';')
+        if not statement.upper().startswith(('SELECT', 'WITH')) or ';' in statement:
+            return None
+        try:
+            plan = self.__run(f'EXPLAIN (ANALYZE, BUFFERS) {statement}', data, lambda curs: curs.fetchall(),
+                              default=[], compact=True, instrument=False)
+        except pg.Error as e:
+            logger.warning(f'Could not explain slow query: {e}')
+            if not self._pool:
+                self._connection.rollback()
+            return None
+        return '\n'.join([row[0] for row in plan])
 
-    def __query_many(self, sql: str, data={}, num=100):
-        if self._check_connection():
-            with self._connection.cursor() as curs:
-                curs.execute(sql, data)
-                return curs.fetchmany(num)
-        else:
+    def add_query_hook(self, hook: Callable[[str, Dict, str, float, int], None]):
+        """
+        Adds a hook that is called after every query with the sql, its parameters, the calling database method, the
+        duration in seconds and the number of rows.
+        """
+        self._query_hooks.append(hook)
+
+    def remove_query_hook(self, hook):
+        if hook in self._query_hooks:
+            self._query_hooks.remove(hook)
+
+    def get_query_stats(self, top: int = 20):
+        """Returns the query statistics per caller and the top query shapes by total time."""
+        return self._query_stats.get_stats(top)
+
+    def get_query_metrics(self) -> str:
+        """Returns the query statistics in the Prometheus text format."""
+        return self._query_stats.to_prometheus()
+
+    def reset_query_stats(self):
+        self._query_stats.reset()
+
+    def __iterate(self, sql: str, data={}, itersize: int = None, caller: str = None) -> Iterator[RealDictRow]:
+        """
+        Yields the rows of sql from a named server side cursor. The cursor only lives in the current transaction, so
+        it cannot be prepared and statements committed on the shared connection while iterating invalidate it.
+        :param caller: The database method the rows are streamed for, the generator runs after it returned
+        """
+        if not self._check_connection():
             logger.error('Could not execute query. Not database connection established.')
-            return []
+            return
+        start = time.perf_counter()
+        rows = 0
+        with self._get_connection() as connection:
+            with connection.cursor(f'cat_cursor_{next(self._cursor_ids)}') as curs:
+                curs.itersize = itersize or self.itersize
+                curs.execute(sql, data)
+                for row in curs:
+                    rows += 1
+                    yield row
+        self._record_query(sql, data, '', time.perf_counter() - start, rows, caller=caller)
+
+    def __get_prepared_statement(self, connection, curs, sql):
+        name, statement, parameter_names = self._query_cache.get_statement(sql)
+        connection.prepare(curs, name, statement, self._query_cache.max_size)
+        if not parameter_names:
+            return f'EXECUTE {name}'
+        return f'EXECUTE {name} (' + ', '.join([f'%({parameter})s' for parameter in parameter_names]) + ')'
+
+    def __query_one(self, sql, data={}):
+        return self.__run(sql, data, lambda curs: curs.fetchone(), default={})
+
+    def __query_many(self, sql: str, data={}, num=100):
+        return self.__run(sql, data, lambda curs: curs.fetchmany(num), default=[])
 
     def __query_all(self, sql: str, data={}):
-        if self._check_connection():
-            with self._connection.cursor() as curs:
-                curs.execute(sql, data)
-                return curs.fetchall()
-        else:
-            logger.error('Could not execute query. Not database connection established.')
-            return []
+        return self.__run(sql, data, lambda curs: curs.fetchall(), default=[])
+
+    def __query_compact(self, sql: str, data={}, prepare=False) -> CompactResult:
+        return self.__run(sql, data, lambda curs: CompactResult([c.name for c in curs.description], curs.fetchall()),
+                          default=CompactResult((), []), prepare=prepare, compact=True)
 
     def __execute(self, sql: str, data={}):
-        if self._check_connection():
-            with self._connection.cursor() as curs:
-                curs.execute(sql, data)
-                self._connection.commit()
-        else:
-            logger.error('Could not execute query. Not database connection established.')
+        self.__run(sql, data, commit=True)
 
     def __generate_metaschema(self):
         self._metaschema = MetaSchema(name=self.schema_name)
+        self._procedures = {}
         if self._check_connection():
+            fingerprint = self.__get_catalog_fingerprint()
+            self._catalog_fingerprint = fingerprint
+            snapshot = self._metaschema_snapshot.load(fingerprint)
+            if snapshot:
+                logger.debug('Loaded schema from snapshot')
+                self._metaschema, self._dependencies, self.types, self.type_categories = snapshot
+                return
             logger.debug('Generating schema for current database connection...')
             self.__get_data_types()
             self._metaschema.tables = self.__generate_schema_tables(self.schema_name)
@@ -693,9 +1555,60 @@ class PostgreSQLDatabase:
             self._dependencies = self.__generate_dependency_graph(self._metaschema.table_names())
             self._metaschema.mapping_tables = [table.name for table in self._metaschema.tables if
                                                self._metaschema._is_mapping_table(table)]
+            self._metaschema_snapshot.save(fingerprint, (self._metaschema, self._dependencies, self.types,
+                                                         self.type_categories))
         else:
             logger.error('Could not generate schema. No database connection established.')
 
+    def __build_join_plan(self):
+        if self.join_plan_file and os.path.exists(self.join_plan_file):
+            try:
+                join_plan = JoinPlan.load(self.join_plan_file, self._dependencies, self._metaschema.mapping_tables)
+                if join_plan.fingerprint == self._catalog_fingerprint:
+                    logger.debug(f'Loaded join plan {self.join_plan_file}')
+                    self._join_plan = join_plan
+                    return
+                logger.warning(f'Join plan {self.join_plan_file} does not match the schema, rebuilding it')
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f'Could not load join plan {self.join_plan_file}: {e}')
+        self._join_plan = JoinPlan(self._dependencies, self._metaschema.mapping_tables, self._catalog_fingerprint)
+        self._join_plan.build(self._metaschema.table_names())
+
+    def save_join_plan(self, path: str):
+        """Writes the join plan of the schema, including all join orders and clauses computed so far."""
+        self._join_plan.save(path)
+
+    def __get_catalog_fingerprint(self):
+        # hash of everything the metaschema is generated from: columns, constraints, procedures and types
+        columns_query = "SELECT string_agg(c.relname || '.' || a.attname || ':' || a.atttypid || ':' || a.attnotnull," \
+                        " ',' ORDER BY c.relname, a.attnum)" \
+                        " FROM pg_catalog.pg_attribute a" \
+                        " JOIN pg_catalog.pg_class c ON a.attrelid = c.oid" \
+                        " JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid" \
+                        " WHERE n.nspname = %(schema)s AND c.relkind = 'r' AND a.attnum > 0 AND NOT a.attisdropped" \
+                        " AND c.relname !~ %(result_tables)s"
+        constraints_query = "SELECT string_agg(c.conrelid::regclass || '.' || c.conname || ':'" \
+                            " || pg_catalog.pg_get_constraintdef(c.oid), ',' ORDER BY c.conrelid::regclass::TEXT," \
+                            " c.conname)" \
+                            " FROM pg_catalog.pg_constraint c" \
+                            " JOIN pg_catalog.pg_namespace n ON c.connamespace = n.oid" \
+                            " WHERE n.nspname = %(schema)s AND c.conrelid NOT IN" \
+                            " (SELECT oid FROM pg_catalog.pg_class WHERE relname ~ %(result_tables)s)"
+        procedures_query = "SELECT string_agg(p.oid || ':' || p.proname || ':' || p.prokind || ':' || p.prorettype" \
+                           " || ':' || p.proargtypes::TEXT || ':' || COALESCE(p.proallargtypes::TEXT, '')" \
+                           " || ':' || COALESCE(p.proargnames::TEXT, '') || ':' || COALESCE(p.proargmodes::TEXT, '')" \
+                           " || ':' || md5(p.prosrc), ',' ORDER BY p.oid)" \
+                           " FROM pg_catalog.pg_proc p" \
+                           " JOIN pg_catalog.pg_namespace n ON p.pronamespace = n.oid" \
+                           " WHERE n.nspname = 'public'"
+        types_query = "SELECT count(*) || ':' || max(oid::TEXT::BIGINT) FROM pg_catalog.pg_type"
+        row = self.__query_one(f"SELECT md5(concat_ws('|', %(schema)s, ({columns_query}), ({constraints_query}),"
+                               f" ({procedures_query}), ({types_query}))) AS fingerprint", {
+                                   'schema': self.schema_name,
+                                   'result_tables': RESULT_TABLE_PATTERN
+                               })
+        return row['fingerprint'] if row else None
+
     def __get_data_types(self):
         # get postgres types dictory - pg_proc only reveales type ids
         result = self.__query_all(
@@ -706,65 +1619,60 @@ class PostgreSQLDatabase:
         self.type_categories = dict([(t['typname'], t['typcategory']) for t in result])
 
     def __generate_schema_tables(self, schema_name) -> List[Table]:
-        tables = []
+        params = {'schema_name': schema_name}
         table_names = [t['table_name'] for t in self.__query_all(
             "SELECT table_name FROM information_schema.tables \
-            WHERE table_schema=%(table_schema)s \
-            AND table_type='BASE TABLE';", {'table_schema': schema_name})]
-        for table_name in table_names:
-            # primary keys
-            primary_key_rows = self.__query_all(
-                "SELECT column_name FROM information_schema.table_constraints t \
+            WHERE table_schema=%(schema_name)s \
+            AND table_type='BASE TABLE' AND table_name !~ %(result_tables)s;",
+            dict(params, result_tables=RESULT_TABLE_PATTERN))]
+        # primary keys
+        primary_keys = defaultdict(list)
+        for row in self.__query_all(
+                "SELECT k.table_name, k.column_name FROM information_schema.table_constraints t \
                 LEFT JOIN information_schema.key_column_usage k \
                 ON t.constraint_name = k.constraint_name AND t.table_name = k.table_name \
-                WHERE k.constraint_schema =%(schema_name)s AND k.table_name = %(table_name)s \
-                AND t.constraint_type = 'PRIMARY KEY'",
-                {'schema_name': schema_name,
-                 'table_name': table_name
-                 })
-            primary_key = []
-            if primary_key_rows:
-                primary_key = [primary_key_row['column_name'] for primary_key_row in
-                               primary_key_rows]
-            table = Table(name=table_name, primary_key=primary_key)
-
-            # columns
-            columns_data = [c for c in self.__query_all(
-                # column_name, data_type, is_nullable
-                "SELECT column_name, udt_name As data_type, is_nullable FROM information_schema.columns \
-                WHERE table_schema = %(schema_name)s AND table_name = %(table_name)s",
-                {'schema_name': schema_name,
-                 'table_name': table_name})]
+                WHERE k.constraint_schema =%(schema_name)s \
+                AND t.constraint_type = 'PRIMARY KEY' \
+                ORDER BY k.table_name, k.ordinal_position", params):
+            primary_keys[row['table_name']].append(row['column_name'])
+        # columns
+        columns_data = defaultdict(list)
+        for row in self.__query_all(
+                "SELECT table_name, column_name, udt_name As data_type, is_nullable FROM information_schema.columns \
+                WHERE table_schema = %(schema_name)s \
+                ORDER BY table_name, ordinal_position", params):
+            columns_data[row['table_name']].append(row)
+        # foreign keys, only the first reference of a column is used
+        foreign_keys = {}
+        for row in self.__query_all(
+                "SELECT	kcu.table_name, kcu.column_name, \
+                rel_kcu.table_name AS foreign_table_name, rel_kcu.column_name AS foreign_column_name \
+                FROM information_schema.table_constraints tco \
+                JOIN information_schema.key_column_usage kcu ON \
+                tco.constraint_schema = kcu.constraint_schema \
+                AND tco.constraint_name = kcu.constraint_name \
+                JOIN information_schema.referential_constraints rco \
+                ON tco.constraint_name = rco.constraint_name \
+                AND tco.constraint_schema = rco.constraint_schema \
+                JOIN information_schema.key_column_usage rel_kcu \
+                ON rco.unique_constraint_schema = rel_kcu.constraint_schema \
+                AND rco.unique_constraint_name = rel_kcu.constraint_name \
+                AND kcu.ordinal_position = rel_kcu.ordinal_position \
+                AND rco.constraint_name = tco.constraint_name \
+                WHERE kcu.constraint_schema = %(schema_name)s AND tco.constraint_type = 'FOREIGN KEY'", params):
+            foreign_keys.setdefault((row['table_name'], row['column_name']), row)
 
+        tables = []
+        for table_name in table_names:
+            table = Table(name=table_name, primary_key=primary_keys.get(table_name, []))
             columns = []
-            for c in columns_data:
+            for c in columns_data.get(table_name, []):
                 column_name = c['column_name']
                 data_type = c['data_type']
                 nullable = c['is_nullable']
                 is_nullable = True if nullable == 'YES' else False
                 column = Column(name=column_name, data_type=data_type, nullable=is_nullable)
-
-                foreign_key_row = self.__query_one(
-                    "SELECT	rel_kcu.table_name AS foreign_table_name, rel_kcu.column_name AS foreign_column_name \
-                    FROM information_schema.table_constraints tco \
-                    JOIN information_schema.key_column_usage kcu ON \
-                    tco.constraint_schema = kcu.constraint_schema \
-                    AND tco.constraint_name = kcu.constraint_name \
-                    JOIN information_schema.referential_constraints rco \
-                    ON tco.constraint_name = rco.constraint_name \
-                    AND tco.constraint_schema = rco.constraint_schema \
-                    JOIN information_schema.key_column_usage rel_kcu \
-                    ON rco.unique_constraint_schema = rel_kcu.constraint_schema \
-                    AND rco.unique_constraint_name = rel_kcu.constraint_name \
-                    AND kcu.ordinal_position = rel_kcu.ordinal_position \
-                    AND rco.constraint_name = tco.constraint_name \
-                    WHERE kcu.constraint_schema = %(schema_name)s AND kcu.table_name = %(table_name)s AND\
-                    kcu.column_name = %(column_name)s AND tco.constraint_type = 'FOREIGN KEY'",
-                    {
-                        'schema_name': schema_name,
-                        'table_name': table_name,
-                        'column_name': column_name
-                    })
+                foreign_key_row = foreign_keys.get((table_name, column_name))
                 if foreign_key_row:
                     column.table_reference = foreign_key_row['foreign_table_name']
                     column.column_reference = foreign_key_row['foreign_column_name']
@@ -839,37 +1747,96 @@ class PostgreSQLDatabase:
 
     def __build_informativity_cache(self, use_primary_keys=False):
         logger.debug('Building cache for base table informativity')
-        informativity_table = {}
-        for table in self._metaschema.tables:
-            logger.debug(f'Caching table {table.name}')
-            column_names = [column.name for column in table.columns if
-                            use_primary_keys or column.name not in table.primary_key]
-            informativity_table[table.name] = self.get_column_entropies(table.name, column_names)
-        self._informativity_cache = informativity_table
+        versions = self.__get_table_versions()
+        cached_tables = self._informativity_store.load()
+        stale_tables = self._informativity_store.get_stale_tables(cached_tables, versions)
+        self._informativity_cache = dict([(table, cached['informativity']) for table, cached in cached_tables.items()
+                                          if table in versions and table not in stale_tables])
+        if not stale_tables:
+            logger.debug('Informativity cache is up to date')
+            return
+        logger.debug(f'Refreshing informativity cache for {len(stale_tables)} of {len(versions)} tables')
+        if self.refresh_cache_async:
+            threading.Thread(target=self.__refresh_informativity_cache,
+                             args=(stale_tables, versions, use_primary_keys),
+                             name='informativity-cache', daemon=True).start()
+        else:
+            self.__refresh_informativity_cache(stale_tables, versions, use_primary_keys)
+
+    def __refresh_informativity_cache(self, stale_tables, versions, use_primary_keys=False):
+        tables = dict([(table.name, table) for table in self._metaschema.tables])
+        try:
+            for table_name in stale_tables:
+                logger.debug(f'Caching table {table_name}')
+                table = tables[table_name]
+                column_names = [column.name for column in table.columns if
+                                use_primary_keys or column.name not in table.primary_key]
+                self._informativity_cache[table_name] = self.get_column_entropies(table_name, column_names)
+        except pg.Error as e:
+            logger.error(f'Could not refresh informativity cache: {e}')
+            return
+        self._informativity_store.save(dict([
+            (table_name, {'version': versions[table_name], 'informativity': informativity})
+            for table_name, informativity in self._informativity_cache.items() if table_name in versions]))
+
+    def __get_table_version(self, table_name):
+        return self._get_table_version_result(self.__query_one(*self._get_table_version_query(table_name)))
+
+    def _get_table_version_query(self, table_name) -> Tuple[str, Dict[str, any]]:
+        return 'SELECT n_tup_ins, n_tup_upd, n_tup_del FROM pg_catalog.pg_stat_user_tables' \
+               ' WHERE schemaname = %(schema)s AND relname = %(table)s', {
+                   'schema': self.schema_name,
+                   'table': table_name
+               }
+
+    @staticmethod
+    def _get_table_version_result(row):
+        return (row['n_tup_ins'], row['n_tup_upd'], row['n_tup_del']) if row else None
+
+    def __get_table_versions(self):
+        # the modification counters of a table change whenever its data (and thus its informativity) changes
+        rows = self.__query_all(
+            'SELECT relname, n_tup_ins, n_tup_upd, n_tup_del FROM pg_catalog.pg_stat_user_tables'
+            ' WHERE schemaname = %(schema)s', {
+                'schema': self.schema_name
+            })
+        counters = dict([(row['relname'], [row['n_tup_ins'], row['n_tup_upd'], row['n_tup_del']]) for row in rows])
+        return dict([(table.name, counters.get(table.name)) for table in self._metaschema.tables])
 
     def __get_table_vertices_edges(self, graph, table_alias):
-        table_prefix, table_name = table_to_fk_and_table(table_alias)
-        table_vertex = DependencyVertex(table_name=table_name,
-                                        table_alias=table_alias)  # , table_alias=table_alias)
-        if table_vertex in graph.vertices:
-            return [], []
-        table = self._metaschema.get_table(table_name)
+        """
+        Collects the vertices and edges reachable from a table by following its foreign keys (depth first, in column
+        order). Tables that are already part of the graph or were visited before are not expanded again.
+        """
+        tables = dict([(table.name, table) for table in self._metaschema.tables])
         vertices = []
         edges = []
-        vertices.append(table_vertex)
-        fk_columns = [column for column in table.columns if column.table_reference and column.column_reference]
-        for column in fk_columns:
-            reference_table = column.table_reference
-            referenced_column = column.column_reference
-            to_table_alias = reference_table
-            edges.append(DependencyEdge(from_table=table_name, to_table=reference_table,
-                                        from_alias=table_alias, to_alias=to_table_alias,
-                                        from_column=column.name, to_column=referenced_column))
+        visited = set()
+
+        def visit(alias):
+            table_prefix, table_name = table_to_fk_and_table(alias)
+            vertex = DependencyVertex(table_name=table_name, table_alias=alias)
+            if alias in visited or vertex in graph:
+                return None
+            visited.add(alias)
+            vertices.append(vertex)
+            return iter([column for column in tables[table_name].columns if
+                         column.table_reference and column.column_reference]), table_name, alias
+
+        frame = visit(table_alias)
+        stack = [frame] if frame else []
+        while stack:
+            fk_columns, table_name, alias = stack[-1]
+            column = next(fk_columns, None)
+            if column is None:
+                stack.pop()
+                continue
+            edges.append(DependencyEdge(from_table=table_name, to_table=column.table_reference,
+                                        from_alias=alias, to_alias=column.table_reference,
+                                        from_column=column.name, to_column=column.column_reference))
             if column.table_reference == table_name:
                 continue
-            rec_vertices, rec_edges = self.__get_table_vertices_edges(graph, to_table_alias)
-            for e in rec_edges:
-                edges.append(e)
-            for v in rec_vertices:
-                vertices.append(v)
+            frame = visit(column.table_reference)
+            if frame:
+                stack.append(frame)
         return vertices, edges
@@ -0,0 +1,41 @@
+import re
+from typing import List, Set, Tuple
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Returns the trigrams of a text like pg_trgm does: the text is lower cased and split into alphanumeric words, each
+    word is padded with two spaces in front and one at the end.
+    """
+    result = set()
+    for word in WORD_PATTERN.findall(str(text).lower()):
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def get_most_similar(values: List[str], value: str, gt_threshold: float = 0) -> Tuple[List[str], float]:
+    """
+    Returns all values with the highest similarity to value, if it is greater than gt_threshold.
+    :return: The most similar values and their similarity, None and 0 if no value is similar enough
+    """
+    value_trigrams = trigrams(value)
+    best_values = []
+    best_similarity = 0
+    for candidate in values:
+        candidate_trigrams = trigrams(candidate)
+        if not value_trigrams or not candidate_trigrams:
+            continue
+        candidate_similarity = len(value_trigrams & candidate_trigrams) / len(value_trigrams | candidate_trigrams)
+        if candidate_similarity <= gt_threshold or candidate_similarity < best_similarity:
+            continue
+        if candidate_similarity > best_similarity:
+            best_values = []
+            best_similarity = candidate_similarity
+        best_values.append(candidate)
+    if not best_values:
+        return None, 0
+    return best_values, best_similarity
@@ -1,5 +1,6 @@
+import heapq
 from collections import defaultdict
-from typing import List
+from typing import List, Dict
 
 
 class DependencyVertex:
@@ -12,6 +13,9 @@ class DependencyVertex:
             return False
         return self.table_name == other.table_name and self.table_alias == other.table_alias
 
+    def __hash__(self):
+        return hash((self.table_name, self.table_alias))
+
     def __str__(self):
         return f'{self.table_alias}'
 
@@ -32,6 +36,9 @@ class DependencyEdge:
                self.from_column == other.from_column and self.to_column == other.to_column and \
                self.from_alias == other.from_alias and self.to_alias == other.to_alias
 
+    def __hash__(self):
+        return hash((self.from_table, self.to_table, self.from_column, self.to_column, self.from_alias, self.to_alias))
+
     def __str__(self):
         return f'{self.from_alias} -> {self.to_alias}'
 
@@ -44,22 +51,41 @@ class DependencyEdge:
 
 
 class DependencyGraph:
-    def __init__(self, vertices: List[DependencyVertex] = [], edges: List[DependencyEdge] = [], directed=False):
-        self.vertices = vertices
-        self.edges = edges
+    def __init__(self, vertices: List[DependencyVertex] = None, edges: List[DependencyEdge] = None, directed=False):
+        self.vertices = []
+        self.edges = []
         self.adjacents = defaultdict(list)
         self.directed = directed
+        # hashed lookups, the lists above keep the insertion order
+        self._vertex_set = set()
+        self._edge_set = set()
+        self._table_edges = defaultdict(list)
+        self._paths = {}
+        for vertex in vertices or []:
+            self.add_vertex(vertex)
+        for edge in edges or []:
+            self.add_edge(edge)
 
     def __str__(self):
         return f'{len(self.vertices)} tables, {len(self.edges)} FK relations'
 
+    def __contains__(self, vertex: DependencyVertex):
+        return vertex in self._vertex_set
+
     def add_vertex(self, vertex: DependencyVertex):
-        if vertex not in self.vertices:
+        if vertex not in self._vertex_set:
+            self._vertex_set.add(vertex)
             self.vertices.append(vertex)
+            self._paths.clear()
 
     def add_edge(self, edge: DependencyEdge):
-        if edge not in self.edges:
+        if edge not in self._edge_set:
+            self._edge_set.add(edge)
             self.edges.append(edge)
+            self._table_edges[edge.from_table].append(edge)
+            if edge.to_table != edge.from_table:
+                self._table_edges[edge.to_table].append(edge)
+            self._paths.clear()
             if edge.to_alias not in self.adjacents[edge.from_alias]:
                 self.adjacents[edge.from_alias].append(edge.to_alias)
                 if not self.directed and edge.from_alias not in self.adjacents[edge.to_alias]:
@@ -67,23 +93,48 @@ class DependencyGraph:
 
     def get_edges(self, vertex_table: str) -> List[DependencyEdge]:
         edges = []
-        for edge in self.edges:
+        for edge in self._table_edges.get(vertex_table, []):
             if edge.from_table == vertex_table:
                 edges.append(edge)
             if not self.directed and edge.to_table == vertex_table:
                 edges.append(edge)
         return edges
 
-    def get_best_dependency_path(self, start_table, end_table, known_tables=[]) -> List[List[str]]:
-        paths = self.get_dependencies_paths(start_table, end_table)
-        required_tables = dict([(i, (set(path) - set(known_tables))) for i, path in enumerate(paths)])
-        if not required_tables:
-            return []
-        least_required = min(required_tables.items(), key=lambda rt: len(rt[1]))
-        if least_required:
-            return list(paths[least_required[0]])
+    def get_best_dependency_path(self, start_table, end_table, known_tables=[]) -> List[str]:
+        """
+        Returns the path between two tables that requires the least tables that are not known yet. Among equally good
+        paths the first one in adjacency order is chosen.
+        """
+        return list(self.get_best_dependency_paths(start_table, known_tables).get(end_table, []))
+
+    def get_best_dependency_paths(self, start_table, known_tables=[]) -> Dict[str, List[str]]:
+        """
+        Returns the best path (see get_best_dependency_path) from a table to every reachable table.
+        """
+        key = (start_table, frozenset(known_tables))
+        if key not in self._paths:
+            self._paths[key] = self._find_best_dependency_paths(start_table, set(known_tables))
+        return self._paths[key]
+
+    def _find_best_dependency_paths(self, start_table, known_tables) -> Dict[str, List[str]]:
+        # dijkstra, every table that is not known costs one, ties are broken by the adjacency positions along the path
+        start_cost = 0 if start_table in known_tables else 1
+        queue = [(start_cost, (), start_table, (start_table,))]
+        paths = {}
+        while queue:
+            cost, positions, table, path = heapq.heappop(queue)
+            if table in paths:
+                continue
+            paths[table] = list(path)
+            for i, neighbor in enumerate(self.adjacents.get(table, [])):
+                if neighbor in paths:
+                    continue
+                neighbor_cost = cost + (0 if neighbor in known_tables else 1)
+                heapq.heappush(queue, (neighbor_cost, positions + (i,), neighbor, path + (neighbor,)))
+        return paths
 
     def get_dependencies_paths(self, from_table: str, to_table: str, path: List[str] = []) -> List[str]:
+        # enumerates all simple paths, use get_best_dependency_path to find a single path
         path = path + [from_table]
         if from_table == to_table:
             return [path]
@@ -0,0 +1,91 @@
+import json
+import logging
+from typing import Dict, List, Tuple
+
+from .graph import DependencyGraph
+
+logger = logging.getLogger('db')
+
+
+class JoinPlan:
+    """
+    Precomputed structural join information of a schema: the join candidates of every table, the best join path
+    between every pair of tables, the ordered join aliases of a query and the resulting FROM clauses.
+
+    Everything only depends on the schema, so a plan can be serialized and loaded by the generated bot as long as the
+    catalog fingerprint matches.
+    """
+
+    def __init__(self, graph: DependencyGraph, mapping_tables: List[str], fingerprint: str = None):
+        self.graph = graph
+        self.mapping_tables = mapping_tables
+        self.fingerprint = fingerprint
+        self._candidates: Dict[Tuple[str, bool], List[str]] = {}
+        self._paths: Dict[str, Dict[str, List[str]]] = {}
+        self.ordered_aliases: Dict[Tuple[str, Tuple[str]], List[str]] = {}
+        self.from_clauses: Dict[Tuple[str], Tuple[str, List[str]]] = {}
+
+    def build(self, table_names: List[str]):
+        for table_name in table_names:
+            for directed in [True, False]:
+                self._get_table_candidates(table_name, directed)
+            self._get_table_paths(table_name)
+        logger.debug(f'Built join plan for {len(table_names)} tables')
+
+    def get_join_candidates(self, tables: List[str], directed=True) -> List[str]:
+        """
+        Same as DependencyGraph.get_join_candidates with the mapping tables of the schema. The candidates of a table
+        set are the candidates of its tables in order, without duplicates and tables of the set.
+        """
+        candidates = []
+        for table in tables:
+            for candidate in self._get_table_candidates(table, directed):
+                if candidate not in tables and candidate not in candidates:
+                    candidates.append(candidate)
+        return candidates
+
+    def get_path(self, start_table: str, end_table: str) -> List[str]:
+        return list(self._get_table_paths(start_table).get(end_table, []))
+
+    def _get_table_candidates(self, table: str, directed: bool) -> List[str]:
+        key = (table, directed)
+        if key not in self._candidates:
+            self._candidates[key] = self.graph.get_join_candidates([table], self.mapping_tables, directed=directed)
+        return self._candidates[key]
+
+    def _get_table_paths(self, start_table: str) -> Dict[str, List[str]]:
+        if start_table not in self._paths:
+            self._paths[start_table] = self.graph.get_best_dependency_paths(start_table)
+        return self._paths[start_table]
+
+    def to_dict(self) -> Dict:
+        return {
+            'fingerprint': self.fingerprint,
+            'candidates': [[table, directed, candidates] for (table, directed), candidates in self._candidates.items()],
+            'paths': [[start, end, path] for start, paths in self._paths.items() for end, path in paths.items()],
+            'ordered_aliases': [[target, sorted(aliases), ordered]
+                                for (target, aliases), ordered in self.ordered_aliases.items()],
+            'from_clauses': [[list(ordered), clause, joined] for ordered, (clause, joined) in self.from_clauses.items()]
+        }
+
+    @staticmethod
+    def from_dict(data: Dict, graph: DependencyGraph, mapping_tables: List[str]) -> 'JoinPlan':
+        plan = JoinPlan(graph, mapping_tables, data.get('fingerprint'))
+        for table, directed, candidates in data.get('candidates', []):
+            plan._candidates[(table, directed)] = candidates
+        for start, end, path in data.get('paths', []):
+            plan._paths.setdefault(start, {})[end] = path
+        for target, aliases, ordered in data.get('ordered_aliases', []):
+            plan.ordered_aliases[(target, tuple(sorted(aliases)))] = ordered
+        for ordered, clause, joined in data.get('from_clauses', []):
+            plan.from_clauses[tuple(ordered)] = (clause, joined)
+        return plan
+
+    def save(self, path: str):
+        with open(path, mode='w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @staticmethod
+    def load(path: str, graph: DependencyGraph, mapping_tables: List[str]) -> 'JoinPlan':
+        with open(path, encoding='utf-8') as f:
+            return JoinPlan.from_dict(json.load(f), graph, mapping_tables)
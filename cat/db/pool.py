@@ -0,0 +1,141 @@
+import logging
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2 as pg
+import psycopg2.extensions as pgx
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger('db')
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are created lazily up to max_connections. Checking out a connection blocks while all connections are
+    in use (or raises a PoolError after the timeout). Idle connections are health checked before they are handed out
+    and broken connections are replaced transparently.
+    """
+
+    def __init__(self, dsn: str, min_connections: int = 1, max_connections: int = 10, timeout: float = None,
+                 health_check_interval: float = 30, **connect_kwargs):
+        if max_connections < 1 or min_connections > max_connections:
+            raise ValueError(f'Invalid pool size: min {min_connections}, max {max_connections}')
+        self.dsn = dsn
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        for _ in range(min_connections):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def size(self):
+        return self._size
+
+    def getconn(self, timeout: float = None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolError('Connection pool is closed')
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_connections:
+                    # reserve the slot, the connection is opened outside the lock
+                    self._size += 1
+                    connection, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise PoolError(f'No connection available within {timeout}s')
+                self._condition.wait(remaining)
+
+        try:
+            if connection is None or not self._is_healthy(connection, last_used):
+                if connection is not None:
+                    logger.warning('Replacing broken pooled database connection')
+                    self._close(connection)
+                connection = self._open()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        return connection
+
+    def putconn(self, connection, close: bool = False):
+        if not close and not connection.closed and not self._closed:
+            try:
+                # never hand out a connection with an open (or aborted) transaction
+                if connection.info.transaction_status != pgx.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except pg.Error:
+                close = True
+        else:
+            close = True
+        if close:
+            self._close(connection)
+        with self._condition:
+            if close:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        connection = self.getconn(timeout)
+        try:
+            yield connection
+        finally:
+            self.putconn(connection, close=bool(connection.closed))
+
+    def closeall(self):
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._close(connection)
+                self._size -= 1
+            self._condition.notify_all()
+
+    def _open(self):
+        return pg.connect(self.dsn, **self.connect_kwargs)
+
+    def _is_healthy(self, connection, last_used: float) -> bool:
+        if connection.closed or connection.info.transaction_status == pgx.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if self.health_check_interval is None or time.monotonic() - last_used < self.health_check_interval:
+            return True
+        # connection was idle for a while, make sure the server did not drop it
+        try:
+            with connection.cursor() as curs:
+                curs.execute('SELECT 1')
+            connection.rollback()
+            return True
+        except pg.Error:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except pg.Error:
+            pass
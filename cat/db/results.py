@@ -0,0 +1,127 @@
+import hashlib
+import threading
+import time
+from typing import Dict, List, Tuple, Iterator
+
+import numpy as np
+
+RESULT_TABLE_PREFIX = 'matches'
+# the result tables, the session result tables and their registry are not part of the schema
+RESULT_TABLE_PATTERN = f'^{RESULT_TABLE_PREFIX}(_[0-9a-f]{{16}}|_sessions)?$'
+
+
+class CompactResult:
+    """
+    A query result as plain tuples with one shared column index, instead of a dict with the column names per row.
+
+    Used by internal consumers that only read a few columns; rows are turned into dicts with to_dicts where they leave
+    the database layer.
+    """
+    __slots__ = ('columns', 'index', 'rows')
+
+    def __init__(self, columns: Tuple[str, ...], rows: List[tuple]):
+        self.columns = tuple(columns)
+        self.index = dict([(column, i) for i, column in enumerate(self.columns)])
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self.rows)
+
+    def __getitem__(self, i: int) -> tuple:
+        return self.rows[i]
+
+    def get(self, row: tuple, column: str):
+        return row[self.index[column]]
+
+    def column(self, column: str) -> List[any]:
+        i = self.index[column]
+        return [row[i] for row in self.rows]
+
+    def to_array(self, column: str, dtype=None) -> np.ndarray:
+        """Returns the values of a column as a NumPy array, e.g. with dtype float for numeric columns."""
+        return np.array(self.column(column), dtype=dtype)
+
+    def to_dicts(self) -> List[Dict[str, any]]:
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+
+class SessionResultTable:
+    def __init__(self, name: str):
+        self.name = name
+        self.shape = None
+        self.last_access = time.monotonic()
+
+
+class SessionResultTables:
+    """
+    Registry of the intermediate result tables of the running conversations.
+
+    Every session (tracker sender id) gets its own unlogged result table, so concurrent conversations do not overwrite
+    each other's results. The registry remembers the shape (selected columns) of the last result, which allows to
+    refill an existing table instead of dropping and recreating it, and expires tables that were not used within the
+    ttl. The database records the last fill of every table in the registry table, so other processes that share the
+    schema can tell the tables of expired sessions from the ones that are still in use.
+    """
+
+    def __init__(self, ttl: float = 3600, prefix: str = RESULT_TABLE_PREFIX):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.registry = f'{prefix}_sessions'
+        self._tables: Dict[str, SessionResultTable] = {}
+        self._lock = threading.Lock()
+
+    def table_name(self, session_id: str) -> str:
+        digest = hashlib.md5(str(session_id).encode('utf-8')).hexdigest()[:16]
+        return f'{self.prefix}_{digest}'
+
+    def get(self, session_id: str) -> SessionResultTable:
+        with self._lock:
+            table = self._tables.get(session_id)
+            if not table:
+                table = SessionResultTable(self.table_name(session_id))
+                self._tables[session_id] = table
+            table.last_access = time.monotonic()
+            return table
+
+    def update(self, session_id: str, shape: str) -> bool:
+        """
+        Stores the shape of the new result of a session.
+        :return: True if the result table of the session already exists with the same shape and can be refilled
+        """
+        with self._lock:
+            table = self._tables.get(session_id)
+            if not table:
+                table = SessionResultTable(self.table_name(session_id))
+                self._tables[session_id] = table
+            reusable = table.shape == shape
+            table.shape = shape
+            table.last_access = time.monotonic()
+            return reusable
+
+    def invalidate(self, session_id: str):
+        """Forgets the shape of a session table, e.g. if filling it failed."""
+        with self._lock:
+            table = self._tables.get(session_id)
+            if table:
+                table.shape = None
+
+    def release(self, session_id: str) -> str:
+        with self._lock:
+            table = self._tables.pop(session_id, None)
+        return table.name if table else None
+
+    def expire(self) -> List[str]:
+        """
+        Removes all sessions that were not accessed within the ttl.
+        :return: The names of the result tables to drop
+        """
+        if self.ttl is None:
+            return []
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [session_id for session_id, table in self._tables.items() if table.last_access < deadline]
+            return [self._tables.pop(session_id).name for session_id in expired]
+
@@ -0,0 +1,36 @@
+import threading
+from collections import deque
+from typing import Callable, List
+
+
+class ColumnSamplePool:
+    """
+    In-memory pools of randomly drawn column values.
+
+    Values are drawn in batches through the given draw function (table, column, n) and handed out one by one, a pool is
+    refilled once it is exhausted.
+    """
+
+    def __init__(self, draw: Callable[[str, str, int], List[any]], batch_size: int = 1000):
+        self.draw = draw
+        self.batch_size = batch_size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, table_name: str, column_name: str):
+        """
+        :return: A random value of the column, None if the column has no values
+        """
+        with self._lock:
+            pool = self._pools.setdefault((table_name, column_name), deque())
+            if not pool:
+                pool.extend(self.draw(table_name, column_name, self.batch_size))
+            return pool.popleft() if pool else None
+
+    def clear(self, table_name: str = None):
+        with self._lock:
+            if table_name is None:
+                self._pools.clear()
+            else:
+                for key in [key for key in self._pools.keys() if key[0] == table_name]:
+                    del self._pools[key]
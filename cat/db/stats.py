@@ -0,0 +1,169 @@
+import hashlib
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List
+
+UNKNOWN_CALLER = 'unknown'
+# upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_callers = threading.local()
+# coroutines share a thread, so the caller of a coroutine is kept in its context instead
+_async_caller: ContextVar = ContextVar('caller', default=None)
+
+
+def instrumented(func):
+    """
+    Marks a database method as the caller of the queries it runs. Nested calls are attributed to the outermost
+    instrumented method, e.g. the entropy queries of get_next_slot to get_next_slot.
+    """
+
+    return with_caller(func.__name__, func)
+
+
+def with_caller(caller: str, func):
+    """
+    Runs func as caller, e.g. to attribute the queries of a worker thread to the caller of the thread that started it.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_callers, 'stack', None)
+        if stack is None:
+            stack = _callers.stack = []
+        stack.append(caller)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+
+    return wrapper
+
+
+def instrumented_async(func):
+    """Same as instrumented for the coroutines of the asyncio database."""
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _async_caller.set(_async_caller.get() or func.__name__)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _async_caller.reset(token)
+
+    return wrapper
+
+
+def get_caller() -> str:
+    stack = getattr(_callers, 'stack', None)
+    if stack:
+        return stack[0]
+    return _async_caller.get() or UNKNOWN_CALLER
+
+
+def get_shape_key(sql: str) -> str:
+    """Generated queries of the same shape have the same text, the key is a short hash of it."""
+    return hashlib.md5(sql.encode('utf-8')).hexdigest()[:12]
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative_counts(self) -> List[int]:
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class QueryStats:
+    """
+    Thread-safe latency and row statistics of the executed queries, per caller and per query shape.
+    """
+
+    def __init__(self, max_shapes: int = 1000):
+        self.max_shapes = max_shapes
+        self._latencies: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self._rows: Dict[str, int] = defaultdict(int)
+        self._slow: Dict[str, int] = defaultdict(int)
+        self._shapes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, caller: str, duration: float, rows: int, slow: bool = False):
+        shape = get_shape_key(sql)
+        with self._lock:
+            self._latencies[caller].observe(duration)
+            self._rows[caller] += max(rows, 0)
+            if slow:
+                self._slow[caller] += 1
+            shape_stats = self._shapes.get(shape)
+            if shape_stats is None:
+                if len(self._shapes) >= self.max_shapes:
+                    return
+                shape_stats = self._shapes[shape] = {'query': sql[:500], 'callers': set(), 'calls': 0,
+                                                     'total_time': 0.0, 'max_time': 0.0, 'rows': 0}
+            shape_stats['callers'].add(caller)
+            shape_stats['calls'] += 1
+            shape_stats['total_time'] += duration
+            shape_stats['max_time'] = max(shape_stats['max_time'], duration)
+            shape_stats['rows'] += max(rows, 0)
+
+    def get_stats(self, top: int = 20) -> Dict[str, any]:
+        """
+        :return: The calls, time and rows per caller and the top query shapes by total time
+        """
+        with self._lock:
+            callers = dict([(caller, {
+                'calls': histogram.count,
+                'total_time': histogram.sum,
+                'rows': self._rows[caller],
+                'slow_queries': self._slow[caller]
+            }) for caller, histogram in self._latencies.items()])
+            shapes = sorted([dict(stats, shape=shape, callers=sorted(stats['callers']))
+                             for shape, stats in self._shapes.items()],
+                            key=lambda stats: stats['total_time'], reverse=True)[:top]
+        return {'callers': callers, 'shapes': shapes}
+
+    def to_prometheus(self) -> str:
+        """Returns the statistics in the Prometheus text exposition format."""
+        lines = ['# HELP cat_db_query_duration_seconds Latency of database queries by caller',
+                 '# TYPE cat_db_query_duration_seconds histogram']
+        with self._lock:
+            for caller, histogram in sorted(self._latencies.items()):
+                for bound, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                    lines.append(f'cat_db_query_duration_seconds_bucket{{caller="{caller}",le="{bound}"}} {count}')
+                lines.append(f'cat_db_query_duration_seconds_bucket{{caller="{caller}",le="+Inf"}} {histogram.count}')
+                lines.append(f'cat_db_query_duration_seconds_sum{{caller="{caller}"}} {histogram.sum}')
+                lines.append(f'cat_db_query_duration_seconds_count{{caller="{caller}"}} {histogram.count}')
+            lines += ['# HELP cat_db_query_rows_total Rows returned or affected by database queries by caller',
+                      '# TYPE cat_db_query_rows_total counter']
+            lines += [f'cat_db_query_rows_total{{caller="{caller}"}} {rows}'
+                      for caller, rows in sorted(self._rows.items())]
+            lines += ['# HELP cat_db_slow_queries_total Queries above the slow query threshold by caller',
+                      '# TYPE cat_db_slow_queries_total counter']
+            lines += [f'cat_db_slow_queries_total{{caller="{caller}"}} {count}'
+                      for caller, count in sorted(self._slow.items())]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._rows.clear()
+            self._slow.clear()
+            self._shapes.clear()
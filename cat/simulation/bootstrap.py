@@ -2,9 +2,9 @@ import os
 
 from cat.simulation.builder import RasaBuilder
 from cat.simulation.generator import IntentGenerator, ResponseGenerator
-from cat.simulation.common.persistence import Persistor
+from cat.simulation.common.persistence import Persistor, FSYNC_NEVER, FSYNC_CLOSE, FSYNC_FLUSH
 from cat.simulation.interaction.user import UserProfile
-from cat.simulation.simulator import DialogSimulator
+from cat.simulation.simulator import DialogSimulator, ENGINE_THREADS, ENGINE_COROUTINES
 from cat.simulation.interaction.frames import TransactionFrame
 from cat.simulation.common.transform import *
 
@@ -12,6 +12,7 @@ from argparse import ArgumentParser
 from cat.db.database import PostgreSQLDatabase
 from typing import List, Dict
 from cat.common.utils import add_db_arguments, load_json, str2bool
+from cat.common.rng import Random
 import logging
 
 logger = logging.getLogger('simulator')
@@ -32,7 +33,13 @@ class BotGenerator:
                  paraphrasers: List[str] = [],
                  pivot_languages = [],
                  schema_name='public',
-                 deploy=False):
+                 deploy=False,
+                 simulation_engine=ENGINE_THREADS,
+                 concurrency=1,
+                 workers=1,
+                 seed=None,
+                 story_buffer_size=1,
+                 story_fsync=FSYNC_NEVER):
         self.bot_name = bot_name
         self.tasks = tasks
         self.frames = [TransactionFrame(task) for task in self.tasks]
@@ -44,10 +51,19 @@ class BotGenerator:
         self.num_nlu_samples = num_nlu_samples
         self.transaction_failure_ratio = transaction_failure_ratio
         self.user_profile = user_profile
-
-        self.persistor = Persistor(bot_name)
-
-        self.simulator = DialogSimulator(tasks=self.tasks, persistor=self.persistor)
+        self.workers = workers
+        self.seed = seed
+        # one generator for the whole generation, the simulation, the NLU generation and the database sampling
+        # draw from independent sub-streams of it
+        self.rng = Random(seed)
+        simulation_rng, nlg_rng, db_rng = self.rng.spawn(3)
+        if seed is not None:
+            PostgreSQLDatabase.get_instance().set_random_seed(db_rng.seed_sequence)
+
+        self.persistor = Persistor(bot_name, story_buffer_size=story_buffer_size, story_fsync=story_fsync)
+
+        self.simulator = DialogSimulator(tasks=self.tasks, persistor=self.persistor, engine=simulation_engine,
+                                         concurrency=concurrency, rng=simulation_rng)
         self.response_generator = ResponseGenerator(frames=self.frames,
                                                     response_templates=response_templates,
                                                     schema_name=schema_name,
@@ -57,12 +73,13 @@ class BotGenerator:
                                                 intent_templates=intent_templates,
                                                 paraphrasers=paraphrasers,
                                                 pivot_languages=pivot_languages,
-                                                persistor=self.persistor)
+                                                persistor=self.persistor,
+                                                rng=nlg_rng)
 
     def generate(self):
         # Run dialog simulation
         if self.num_dialogs > 0:
-            self.simulator.run(num_dialogs=self.num_dialogs, tasks=self.tasks)
+            self.simulator.run(num_dialogs=self.num_dialogs, tasks=self.tasks, workers=self.workers)
         # Run NLU generation/intent extraction
         intents = self.intent_generator.generate_intents(
             num_samples=self.num_nlu_samples
@@ -103,6 +120,22 @@ if __name__ == '__main__':
                         help='The ratio of failing transactions during simulation')
     parser.add_argument('-d', '--deploy', type=str2bool, nargs='?', const=True, default=False,
                         help='Whether to move bot to test directory', required=False)
+    parser.add_argument('-e', '--engine', type=str, choices=[ENGINE_THREADS, ENGINE_COROUTINES],
+                        default=ENGINE_THREADS, help='Run the user and agent of a dialog in two threads or as '
+                                                     'coroutines in a single thread')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help='The number of dialogs the coroutine engine interleaves')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='The number of processes the dialogs are simulated in')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='The seed of the dialog simulation, the NLU generation and the database samples')
+    parser.add_argument('--story_buffer', type=int, default=1,
+                        help='The number of simulated stories that are written to the stories file at once')
+    parser.add_argument('--story_fsync', type=str, choices=[FSYNC_NEVER, FSYNC_CLOSE, FSYNC_FLUSH],
+                        default=FSYNC_NEVER, help='Whether to sync the stories file to disk never, when the simulation '
+                                                  'is finished or after every write')
+    parser.add_argument('-trgm', '--trigram_indexes', type=str2bool, nargs='?', const=True, default=False,
+                        help='Whether to create trigram indexes for the requestable string columns', required=False)
 
     args = parser.parse_args()
 
@@ -117,6 +150,12 @@ if __name__ == '__main__':
     schema = transform_config(schema_config)
     response_templates, intent_templates = transform_templates(template_config)
 
+    if args.trigram_indexes:
+        db.create_trigram_indexes(dict([
+            (table['name'], [column['name'] for column in table['columns'] if column['requestable'] and
+                             db.get_column_type(table['name'], column['name']) == 'string'])
+            for table in schema['tables']]))
+
     generator = BotGenerator(bot_name=args.bot_name,
                              tasks=tasks,
                              schema=schema,
@@ -129,5 +168,11 @@ if __name__ == '__main__':
                              paraphrasers=args.paraphrasers,
                              pivot_languages=args.pivot_languages,
                              schema_name=args.db_schema,
-                             deploy=args.deploy)
+                             deploy=args.deploy,
+                             simulation_engine=args.engine,
+                             concurrency=args.concurrency,
+                             workers=args.workers,
+                             seed=args.seed,
+                             story_buffer_size=args.story_buffer,
+                             story_fsync=args.story_fsync)
     generator.generate()
@@ -2,7 +2,8 @@ import logging
 from cat.simulation.common.actions import *
 from cat.simulation.common.intents import *
 from cat.simulation.common.constants import *
-from cat.simulation.common.persistence import Persistor
+from cat.simulation.common.persistence import Persistor, JOIN_PLAN_FILE
+from cat.db.database import PostgreSQLDatabase
 from cat.simulation.interaction.frames import TransactionFrame, SelectFrame
 
 DOMAIN_SESSION_CONFIG_KEY = 'session_config'
@@ -108,6 +109,8 @@ class RasaBuilder:
         self.persistor.persist_config(self.config)
         self.persistor.persist_endpoints(self.endpoints)
         self.persistor.persist_credentials(self.credentials)
+        # the bot loads the join plan instead of recomputing it
+        PostgreSQLDatabase.get_instance().save_join_plan(self.persistor.join_plan_file)
         self.persistor.copy_utils()
 
     def _add_slot_to_domain(self, slot_name, slot_type=LIST_SLOT_TYPE, is_entity=True):
@@ -187,7 +190,13 @@ class RasaBuilder:
             'name': 'tcb',
             'schema': self.schema_name,
             'user': 'tcb',
-            'password': 'tcb'
+            'password': 'tcb',
+            'pool_size': 1,
+            'session_ttl': 3600,
+            'informativity_mode': 'exact',
+            'refresh_cache_async': False,
+            'prepare_statements': True,
+            'join_plan': JOIN_PLAN_FILE
         }
 
     def _build_config(self, language='en', embeddings=DEFAULT_NLU_PIPELINE, policies=DEFAULT_POLICIES):
@@ -250,7 +250,7 @@ class ActionSelect(CustomAction):
     def __str__(self):
         return 'action_' + self.name + '_form'
 
-    def run(self):
+    def run(self, rng: Random = default_random):
         informable_slots = self.frame.get_informable_slot_names(self.frame.get_informed_slot_names())
         # if we cant request anything, assume the frame is filled
         if len(informable_slots) == 0:
@@ -258,7 +258,7 @@ class ActionSelect(CustomAction):
             self.frame.update_data(values)
             return self
         if not self.frame.is_filled():
-            next_slot = random.choice(informable_slots)
+            next_slot = rng.choice(informable_slots)
             self.frame.requested_slot = self.frame.get_slot(next_slot)
             self.updated_slots.append(next_slot)
             self.updated_slots.append(REQUESTED_SLOT)
@@ -407,8 +407,8 @@ class ActionValidateChoice(CustomAction):
         name = f'validate_{self.slot.name}'
         CustomAction.__init__(self, name)
 
-    def run(self):
-        self.frame.valid = random.uniform(0.0, 1.0) > self.failure_ratio
+    def run(self, rng: Random = default_random):
+        self.frame.valid = rng.uniform(0.0, 1.0) > self.failure_ratio
         return self
 
     def template_object(self):
@@ -514,9 +514,9 @@ class ActionExecuteTransaction(TransactionAction):
         name = f'execute_transaction_{frame.name}'
         TransactionAction.__init__(self, name, frame)
 
-    def run(self):
+    def run(self, rng: Random = default_random):
         self.frame.clear(clear_subframe=False, unaffirm=False)
-        success = random.uniform(0.0, 1.0) > self.failure_ratio
+        success = rng.uniform(0.0, 1.0) > self.failure_ratio
         if not success:
             self.frame.error = DUMMY_VALUE
         elif self.frame.operation == OPERATION_SELECT:
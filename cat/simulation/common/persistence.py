@@ -5,7 +5,7 @@ import time
 import os
 from threading import Lock
 from typing import List, Dict
-from shutil import copytree, copyfile, move
+from shutil import copytree, copyfile, copyfileobj, move, ignore_patterns
 
 import yaml
 
@@ -17,16 +17,110 @@ DATA_DIR = 'data'
 MODEL_DIR = 'models'
 LOOKUP_TABLE_DIR = 'lookup_tables'
 STORIES_FILE = 'stories.md'
+STORIES_SHARD_FILE = 'stories_{}.md'
 NLU_FILE = 'nlu.json'
+JOIN_PLAN_FILE = 'join_plan.json'
+# fsync policies of the stories file
+FSYNC_NEVER = 'never'
+FSYNC_CLOSE = 'close'
+FSYNC_FLUSH = 'flush'
 if not os.path.exists(BOTS_DIR):
     os.mkdir(BOTS_DIR)
 
 logger = logging.getLogger('persistence')
 
 
+class StoryRecorder:
+    """
+    Records the intents and actions of a single dialog in memory, so dialogs that are simulated at the same time do
+    not write into each other's stories. The recorded story is written with Persistor.write_story.
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def log_intent(self, intent: Intent):
+        if intent.do_log():
+            self.lines.append(f'* {intent}\n')
+
+    def log_actions(self, actions: List[AbstractAction]):
+        for action in actions:
+            if action.do_log():
+                self.lines.append(f'\t- {str(action)}\n')
+
+
+class StoryWriter:
+    """
+    Buffered writer of a stories file. The current story is collected in memory and finished stories are appended in
+    chunks of buffer_size stories with a single write on a file that stays open. A crash loses the current story and
+    the finished stories that were not written yet, so at most one story with the default buffer size.
+
+    The fsync policy decides when the written stories are synced to disk: never, on close or after every write.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1, fsync: str = FSYNC_NEVER):
+        if fsync not in [FSYNC_NEVER, FSYNC_CLOSE, FSYNC_FLUSH]:
+            raise ValueError(f'Unknown fsync policy {fsync}')
+        self.path = path
+        self.buffer_size = max(1, buffer_size)
+        self.fsync = fsync
+        self._story = None
+        self._stories = []
+        self._file = None
+        self._lock = Lock()
+
+    def new_story(self, header: str):
+        with self._lock:
+            self._end_story()
+            self._story = [header]
+
+    def write(self, lines: List[str]):
+        with self._lock:
+            if self._story is None:
+                self._story = []
+            self._story += lines
+
+    def end_story(self):
+        with self._lock:
+            self._end_story()
+
+    def flush(self):
+        """Writes the finished stories, the current story is only written once it is finished."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._end_story()
+            self._flush()
+            if self._file is not None:
+                if self.fsync == FSYNC_CLOSE:
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def _end_story(self):
+        if self._story is not None:
+            self._stories.append(''.join(self._story))
+            self._story = None
+            if len(self._stories) >= self.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._stories:
+            return
+        if self._file is None:
+            self._file = open(self.path, mode='a', encoding='utf-8')
+        self._file.write(''.join(self._stories))
+        self._stories = []
+        self._file.flush()
+        if self.fsync == FSYNC_FLUSH:
+            os.fsync(self._file.fileno())
+
+
 class Persistor:
 
-    def __init__(self, bot_name: str, timestamp=True):
+    def __init__(self, bot_name: str, timestamp=True, story_buffer_size: int = 1, story_fsync: str = FSYNC_NEVER):
         self.bot_name = bot_name
         unix_timestamp = int(time.mktime(datetime.now().timetuple()))
         self.bot_dir = os.path.join(BOTS_DIR, f'{bot_name}_{unix_timestamp}' if timestamp else bot_name)
@@ -35,6 +129,7 @@ class Persistor:
         self.nlu_file = os.path.join(self.data_dir, NLU_FILE)
         self.lt_dir = os.path.join(self.data_dir, LOOKUP_TABLE_DIR)
         self.stories_file_lock = Lock()
+        self.story_writer = StoryWriter(self.stories_file, buffer_size=story_buffer_size, fsync=story_fsync)
         self.story_id = 1
         self._init_directories_()
         self._init_rasa_files()
@@ -52,6 +147,7 @@ class Persistor:
         self.credentials_file = os.path.join(self.bot_dir, 'credentials.yml')
         self.endpoints_file = os.path.join(self.bot_dir, 'endpoints.yml')
         self.schema_config_file = os.path.join(self.bot_dir, 'schema_config.json')
+        self.join_plan_file = os.path.join(self.bot_dir, JOIN_PLAN_FILE)
 
     def persist_nlu_data(self, nlu_data: Dict, lookup_tables: List[Dict]):
         for lookup_table in lookup_tables:
@@ -89,7 +185,8 @@ class Persistor:
 
     # bootstrapping
     def copy_utils(self):
-        copytree(os.path.abspath('../db'), os.path.abspath(os.path.join(self.bot_dir, 'db')))
+        copytree(os.path.abspath('../db'), os.path.abspath(os.path.join(self.bot_dir, 'db')),
+                 ignore=ignore_patterns('cache'))
         copyfile(os.path.abspath('../common/duckling.py'),
                  os.path.abspath(os.path.join(self.bot_dir, 'duckling.py')))
         copyfile(os.path.abspath('../common/rasa_utils.py'),
@@ -112,28 +209,55 @@ class Persistor:
 
     # Log during simulation
     def new_story(self):
-        with open(self.stories_file, mode='a', encoding='utf-8') as f:
-            if self.story_id > 1:
-                f.write('\n')
-            f.write(f'## story_{self.story_id}\n')
-            self.story_id += 1
+        header = f'## story_{self.story_id}\n'
+        if self.story_id > 1:
+            header = '\n' + header
+        self.story_writer.new_story(header)
+        self.story_id += 1
+
+    def end_story(self):
+        self.story_writer.end_story()
+
+    def close_stories(self):
+        """Writes the buffered stories and closes the stories file."""
+        self.story_writer.close()
+
+    def use_story_shard(self, shard: int, story_id: int):
+        """
+        Writes the following stories into the shard file of a simulation worker, numbered from story_id on.
+        """
+        self.story_writer.close()
+        self.stories_file = os.path.join(self.data_dir, STORIES_SHARD_FILE.format(shard))
+        self.story_id = story_id
+        if os.path.exists(self.stories_file):
+            os.remove(self.stories_file)
+        self.story_writer = StoryWriter(self.stories_file, buffer_size=self.story_writer.buffer_size,
+                                        fsync=self.story_writer.fsync)
+
+    def merge_story_shards(self, shard_files: List[str]):
+        """
+        Appends the story shards to the stories file in the given order and removes them. The shards have to contain
+        consecutive stories, so the numbering of the merged stories is the same as in a sequential run.
+        """
+        with self.stories_file_lock:
+            self.story_writer.close()
+            with open(self.stories_file, mode='a', encoding='utf-8') as f:
+                for shard_file in shard_files:
+                    if not os.path.exists(shard_file):
+                        continue
+                    with open(shard_file, encoding='utf-8') as shard:
+                        copyfileobj(shard, f)
+                    os.remove(shard_file)
+
+    def write_story(self, story: StoryRecorder):
+        with self.stories_file_lock:
+            self.new_story()
+            self.story_writer.write(story.lines)
+            self.end_story()
 
     def log_intent(self, intent: Intent):
-        # file lock to
-        while True:
-            self.stories_file_lock.acquire()
-            if intent.do_log():
-                with open(self.stories_file, mode='a', encoding='utf-8') as f:
-                    f.write(f'* {intent}\n')
-            self.stories_file_lock.release()
-            return
+        if intent.do_log():
+            self.story_writer.write([f'* {intent}\n'])
 
     def log_actions(self, actions: List[AbstractAction]):
-        while True:
-            self.stories_file_lock.acquire()
-            with open(self.stories_file, mode='a', encoding='utf-8') as f:
-                for action in actions:
-                    if action.do_log():
-                        f.write(f'\t- {str(action)}\n')
-            self.stories_file_lock.release()
-            return
+        self.story_writer.write([f'\t- {str(action)}\n' for action in actions if action.do_log()])
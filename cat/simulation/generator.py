@@ -168,13 +168,15 @@ class IntentGenerator:
                  intent_templates: Dict,
                  persistor: Persistor,
                  paraphrasers: List[str] = [],
-                 pivot_languages: List[str] = []):
+                 pivot_languages: List[str] = [],
+                 rng: Random = default_random):
         self.frames = frames
         self.persistor = persistor
         self.intent_templates = intent_templates
         self.nlg_engine = NlgEngine(intent_templates=intent_templates,
                                     paraphraser_names=paraphrasers,
-                                    pivot_languages=pivot_languages)
+                                    pivot_languages=pivot_languages,
+                                    rng=rng)
 
     def generate_intents(self, num_samples):
         self._phrase_intents(num_samples)
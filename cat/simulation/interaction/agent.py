@@ -3,8 +3,7 @@ from cat.simulation.common.intents import *
 from cat.simulation.common.actions import *
 from cat.simulation.common.constants import *
 from cat.simulation.interaction.frames import *
-import numpy.random as random
-import time
+from cat.common.rng import Random, default_random
 import logging
 
 logger: logging.Logger = logging.getLogger('agent')
@@ -12,8 +11,10 @@ logger: logging.Logger = logging.getLogger('agent')
 
 class AgentSimulator:
 
-    def __init__(self, isim: InteractionManager, tasks: List[Task], failure_ratio: float = 0.5):
+    def __init__(self, isim: InteractionManager, tasks: List[Task], failure_ratio: float = 0.5,
+                 rng: Random = default_random):
         self.isim = isim
+        self.rng = rng
         self.tasks = tasks
         self.transaction_frame: TransactionFrame = None
         self.failure_ratio = failure_ratio
@@ -27,19 +28,27 @@ class AgentSimulator:
         self.history = []
 
     def run(self):
+        """Runs the agent in its own thread, waiting for the intents of the user."""
+        for _ in self.steps():
+            self.isim.wait_intent()
+
+    def steps(self):
+        """
+        Generator of the agent dialog. It yields whenever it waits for the next intent of the user, so a scheduler can
+        run many dialogs in a single thread.
+        """
         # first intent is always Greet
-        self.isim.read_intent()
+        yield from self._read_intent()
         self._enqueue_action(UtterGreet())
         self._send()
 
         while True:
-            time.sleep(0.1)
-            found_task = self.run_top_level_dialog()
+            found_task = yield from self.run_top_level_dialog()
             # if the user refuses to find the task just end the conversation
             if found_task:
-                self.run_process_frames()
+                yield from self.run_process_frames()
             # the end dialog might result in a new conversation ("Can i do anything else for you")
-            next_task = self.run_end_dialog()
+            next_task = yield from self.run_end_dialog()
             # if the user denies end the dialog
             if not next_task:
                 return
@@ -63,15 +72,15 @@ class AgentSimulator:
 
     def complete_frame(self, frame):
         if isinstance(frame, SelectFrame):
-            return self.run_select_dialog(frame)
+            return (yield from self.run_select_dialog(frame))
         elif isinstance(frame, ChoiceFrame):
-            return self.run_choice_dialog(frame)
+            return (yield from self.run_choice_dialog(frame))
         elif isinstance(frame, TransactionFrame):
-            return self.run_transaction_dialog(frame)
+            return (yield from self.run_transaction_dialog(frame))
 
     def run_top_level_dialog(self):
         while True:
-            intent = self.isim.read_intent()
+            intent = yield from self._read_intent()
 
             if isinstance(intent, Transaction):
                 self.transaction_frame.update_data(intent.data)
@@ -95,28 +104,26 @@ class AgentSimulator:
         current_frame: Frame = self.get_next_frame()
         do_continue = True
         while current_frame and not current_frame.is_affirmed() and do_continue:
-            do_continue = self.complete_frame(current_frame)
+            do_continue = yield from self.complete_frame(current_frame)
             current_frame = self.get_next_frame()
 
     def run_end_dialog(self):
         self._enqueue_action(UtterAskNextTask())
         self._send()
-        time.sleep(0.1)
 
         # see if the user wants to try something else
-        next_intent = self.isim.read_intent()
+        next_intent = yield from self._read_intent()
         if isinstance(next_intent, Affirm):
             self._enqueue_action(ActionRestartConversation())
             self._enqueue_action(UtterGreet())
             self._send()
-            time.sleep(0.1)
             return True
         # just bye
         else:
             self._enqueue_action(UtterBye())
             self._send()
             # wait for a response
-            next_intent = self.isim.read_intent()
+            next_intent = yield from self._read_intent()
             # clear the conversation
             if isinstance(next_intent, Bye):
                 self._enqueue_action(ActionRestartConversation())
@@ -129,9 +136,7 @@ class AgentSimulator:
         # handle dialog until the frame is affirmed
         while not frame.is_affirmed():
             # wait for the next user input
-            while not self.isim.peek_intent():
-                time.sleep(0.01)
-            next_intent = self.isim.read_intent()
+            next_intent = yield from self._read_intent()
 
             # the user might have asked for options (filled frame or not), continue if did so
             if self._try_handle_select_options(next_intent, frame):
@@ -149,7 +154,7 @@ class AgentSimulator:
 
             if isinstance(next_intent, Deny):
                 self._enqueue_actions([ActionClear(frame).run(unaffirm=True), ActionStartSelectForm(frame),
-                                       ActionSelect(frame).run()])
+                                       ActionSelect(frame).run(self.rng)])
                 self._send()
                 continue
 
@@ -163,7 +168,7 @@ class AgentSimulator:
         ask_param_slot = UtterAskParameter(self.transaction_frame.get_slot(frame.reference))
         start_action = ActionStartSelectForm(frame)
         activate_action = ActionActivateSelectForm(frame)
-        form_action = ActionSelect(frame).run()
+        form_action = ActionSelect(frame).run(self.rng)
         self._enqueue_actions([ask_param_slot, start_action, activate_action, form_action])
         result = self._handle_select_frame_filled(form_action.frame)
         self._send()
@@ -189,7 +194,7 @@ class AgentSimulator:
             frame.update_data(intent.values)
         else:
             return False
-        form_action = ActionSelect(frame).run()
+        form_action = ActionSelect(frame).run(self.rng)
         # if all values are informed
         result = self._handle_select_frame_filled(form_action.frame)
         # otherwise continue
@@ -202,7 +207,7 @@ class AgentSimulator:
         if frame.is_filled():
             # propose the result (one or more values)
             self._enqueue_action(ActionSetSlot(OPTION_RESULTS_SLOT, DUMMY_VALUE, True))
-            frame.single_result = random.choice([True, False])
+            frame.single_result = self.rng.choice([True, False])
             self._enqueue_action(ActionProposeForm(frame))
             self._enqueue_action(ActionSetSlot(OPTION_OFFSET_SLOT, 0, True))
             return True
@@ -260,9 +265,7 @@ class AgentSimulator:
 
         # while the choice is not affirmed continue
         while not frame.is_affirmed():
-            while not self.isim.peek_intent():
-                time.sleep(0.01)
-            next_intent = self.isim.read_intent()
+            next_intent = yield from self._read_intent()
 
             # affirm can be used to utter values for the boolean choice or affirmation
             was_request = any([isinstance(action, UtterRequestChoice) or isinstance(action, UtterAskRephrase) for action in self.history[-1]])
@@ -311,7 +314,7 @@ class AgentSimulator:
             # validate the result
             entity = frame.get_slot().name
             value = intent.values[entity]
-            validation = ActionValidateChoice(frame, entity, value).run()
+            validation = ActionValidateChoice(frame, entity, value).run(self.rng)
             self._enqueue_action(validation)
             # if the validation succeeded
             if validation.frame.valid:
@@ -355,13 +358,11 @@ class AgentSimulator:
 
         # wait for the user to affirm it
         while not frame.is_affirmed():
-            while not self.isim.peek_intent():
-                time.sleep(0.01)
-            next_intent = self.isim.read_intent()
+            next_intent = yield from self._read_intent()
             # execute the transaction on affirmation
             if isinstance(next_intent, Affirm) or isinstance(next_intent, Done):
                 frame.affirm()
-                call_result: ActionExecuteTransaction = ActionExecuteTransaction(frame).run()
+                call_result: ActionExecuteTransaction = ActionExecuteTransaction(frame).run(self.rng)
                 self._enqueue_action(call_result)
                 # if the transaction fails stop the conversation
                 if call_result.frame.error:
@@ -378,11 +379,16 @@ class AgentSimulator:
             if isinstance(next_intent, GiveUp) or isinstance(next_intent, Deny):
                 return False
         # after the transaction is execute the user might respond
-        next_intent = self.isim.read_intent()
+        next_intent = yield from self._read_intent()
         if isinstance(next_intent, Done) or isinstance(next_intent, GiveUp):
             return False
         return True
 
+    def _read_intent(self):
+        while not self.isim.has_intent():
+            yield
+        return self.isim.read_intent()
+
     def _send(self, clear=True):
         if self.actions:
             self.history.append([a for a in self.actions])
@@ -3,63 +3,82 @@ from cat.simulation.common.actions import AbstractAction
 from cat.simulation.common.constants import *
 from cat.simulation.common.persistence import Persistor
 from typing import List
-from threading import Lock
-import time
+from threading import Condition
 
 
 class InteractionManager:
+    """
+    Hands intents from the user to the agent simulator and actions from the agent to the user simulator. Reading
+    blocks until the other side has sent something and wakes up as soon as it did.
+    """
 
     def __init__(self, persistor: Persistor):
         self.persistor = persistor
         self.actions = []
         self.intents = []
-        self.action_lock = Lock()
-        self.intent_lock = Lock()
+        self.condition = Condition()
 
     def prepare(self):
-        self.actions = []
-        self.intents = []
-        self.action_lock = Lock()
-        self.intent_lock = Lock()
+        with self.condition:
+            self.actions = []
+            self.intents = []
 
     def send_intent(self, intent: Intent):
-        self.intent_lock.acquire()
-        if intent:
-            self.persistor.log_intent(intent)
-            self.intents.append(intent)
-        self.intent_lock.release()
+        with self.condition:
+            if intent:
+                self.persistor.log_intent(intent)
+                self.intents.append(intent)
+                self.condition.notify_all()
 
     def send_actions(self, actions: List[AbstractAction]):
-        self.action_lock.acquire()
-        self.persistor.log_actions(actions)
-        self.actions += actions
-        self.action_lock.release()
+        with self.condition:
+            self.persistor.log_actions(actions)
+            self.actions += actions
+            self.condition.notify_all()
+
+    def read_intent(self, timeout: float = None):
+        """
+        Waits for the next intent of the user.
+        :return: The intent, None if no intent was sent within the timeout
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.intents, timeout):
+                return None
+            return self.intents.pop()
+
+    def read_actions(self, timeout: float = None):
+        """
+        Waits for the next actions of the agent.
+        :return: All actions sent since the last read, an empty list if none were sent within the timeout
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.actions, timeout):
+                return []
+            send_actions, self.actions = self.actions, []
+            return send_actions
+
+    def has_intent(self) -> bool:
+        with self.condition:
+            return len(self.intents) > 0
+
+    def has_actions(self) -> bool:
+        with self.condition:
+            return len(self.actions) > 0
 
-    def read_intent(self):
-        # acquire and release lock until intent can be read
-        while True:
-            self.intent_lock.acquire()
-            if self.intents:
-                intent = self.intents.pop()
-                self.intent_lock.release()
-                return intent
-            self.intent_lock.release()
-            # give other thread a chance to continue
-            time.sleep(0.02)
+    def wait_intent(self, timeout: float = None) -> bool:
+        """Waits until an intent was sent without reading it."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.intents, timeout)
 
-    def read_actions(self):
-        # acquire and release lock until actions can be read
-        while True:
-            self.action_lock.acquire()
-            if self.actions:
-                send_actions, self.actions = self.actions, []
-                self.action_lock.release()
-                return send_actions
-            self.action_lock.release()
-            time.sleep(0.01)
+    def wait_actions(self, timeout: float = None) -> bool:
+        """Waits until actions were sent without reading them."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.actions, timeout)
 
     def peek_intent(self):
-        return self.intents[-1] if len(self.intents) > 0 else None
+        with self.condition:
+            return self.intents[-1] if len(self.intents) > 0 else None
 
     def peek_actions(self):
-        return self.actions
\ No newline at end of file
+        with self.condition:
+            return list(self.actions)
@@ -2,10 +2,9 @@ from cat.simulation.interaction.interaction import InteractionManager
 from cat.simulation.common.intents import *
 from cat.simulation.common.constants import *
 from cat.simulation.interaction.goals import *
+from cat.common.rng import Random, default_random
 import logging
 import threading
-import random
-import numpy as np
 
 logger = logging.getLogger('user-simulator')
 
@@ -15,7 +14,8 @@ class UserProfile:
                  give_up_probability: float, informativity_mu: int, informativity_sd: float,
                  max_propose_transaction_deny: int = 1, max_select_deny: int = 1,
                  max_choice_deny: int = 1, max_transaction_deny: int = 1, max_options_scroll=3, max_rephrase=3,
-                 max_followup_tasks=1):
+                 max_followup_tasks=1, rng: Random = default_random):
+        self.rng = rng
         self.ambiguity = ambiguity
         self.indecision = indecision
         self.experience = experience
@@ -34,20 +34,20 @@ class UserProfile:
         self.options_position = 0
 
     @staticmethod
-    def random_profile():
-        ambiguity = random.uniform(0.0, 1.0)
-        indecision = random.uniform(0.0, 1.0)
-        experience = random.uniform(0.0, 1.0)
-        cooperation = random.uniform(0.0, 1.0)
-        flexibility = random.uniform(0.0, 1.0)
-        give_up_probability = random.uniform(0.0, 0.3)
-        informativity_mu = random.randint(1, 3)
-        informativity_sd = random.uniform(1.0, 2.0)
+    def random_profile(rng: Random = default_random):
+        ambiguity = rng.uniform(0.0, 1.0)
+        indecision = rng.uniform(0.0, 1.0)
+        experience = rng.uniform(0.0, 1.0)
+        cooperation = rng.uniform(0.0, 1.0)
+        flexibility = rng.uniform(0.0, 1.0)
+        give_up_probability = rng.uniform(0.0, 0.3)
+        informativity_mu = rng.randint(1, 3)
+        informativity_sd = rng.uniform(1.0, 2.0)
         return UserProfile(ambiguity, indecision, experience, cooperation, flexibility, give_up_probability,
-                           informativity_mu, informativity_sd)
+                           informativity_mu, informativity_sd, rng=rng)
 
     def do_cooperate(self):
-        return random.uniform(0.0, 1.0) > self.cooperation
+        return self.rng.uniform(0.0, 1.0) > self.cooperation
 
     def do_rephrase(self):
         give_up = self.do_give_up()
@@ -59,13 +59,13 @@ class UserProfile:
         return False
 
     def do_ask_options(self):
-        if random.uniform(0.0, 1.0) < self.experience:
+        if self.rng.uniform(0.0, 1.0) < self.experience:
             return False
         return True
 
     def do_ask_different_options(self):
         if self.max_options_scroll > 0:
-            if random.uniform(0.0, 1.0) < self.indecision:
+            if self.rng.uniform(0.0, 1.0) < self.indecision:
                 self.max_options_scroll -= 1
                 return True
         return False
@@ -73,7 +73,7 @@ class UserProfile:
     def do_ask_previous_options(self):
         # only ask previous options if have scrolled forward
         # returning false, the options will be scrolled forward
-        do_prev = self.options_position > 0 and random.uniform(0.0, 1.0) > 0.5
+        do_prev = self.options_position > 0 and self.rng.uniform(0.0, 1.0) > 0.5
         if do_prev:
             self.options_position -= 1
             return True
@@ -82,7 +82,7 @@ class UserProfile:
 
     def do_ask_next_task(self):
         if self.max_followup_tasks > 0:
-            return random.choice([True, False])
+            return self.rng.choice([True, False])
         return False
 
     def do_deny_proposed_transaction(self):
@@ -110,50 +110,67 @@ class UserProfile:
         return deny
 
     def _do_deny(self):
-        return random.uniform(0.0, 1.0) < self.indecision
+        return self.rng.uniform(0.0, 1.0) < self.indecision
 
     def do_ambiguous_choice(self):
-        return random.uniform(0.0, 1.0) > self.ambiguity
+        return self.rng.uniform(0.0, 1.0) > self.ambiguity
 
     def do_give_up(self):
-        return random.uniform(0.0, 1.0) < self.give_up_probability
+        return self.rng.uniform(0.0, 1.0) < self.give_up_probability
 
     def do_resample(self):
-        return random.uniform(0.0, 1.0) > self.flexibility
+        return self.rng.uniform(0.0, 1.0) > self.flexibility
 
     def inform_n(self):
-        n = np.random.normal(self.informativity_mu, self.informativity_sd)
+        n = self.rng.normal(self.informativity_mu, self.informativity_sd)
         return max(1, int(n))
 
 
 class UserSimulator:
 
-    def __init__(self, isim: InteractionManager, tasks: List[Task]):
+    def __init__(self, isim: InteractionManager, tasks: List[Task], rng: Random = default_random):
         self.isim = isim
+        self.rng = rng
         self.state = None
         self.tasks = tasks
 
     def prepare(self, goal, profile: UserProfile = None):
         goal.resample()
         if not profile:
-            profile = UserProfile.random_profile()
+            profile = UserProfile.random_profile(self.rng)
+        else:
+            profile.rng = self.rng
         self.state = UserState(goal, profile)
 
     def run(self):
+        """Runs the user in its own thread, waiting for the actions of the agent."""
+        for _ in self.steps():
+            self.isim.wait_actions()
+
+    def steps(self):
+        """
+        Generator of the user dialog. It yields whenever it waits for the next actions of the agent, so a scheduler can
+        run many dialogs in a single thread.
+        """
         self.isim.send_intent(Greet())
         while True:
             while not self.state.is_satisfied():
-                actions = self.isim.read_actions()
+                actions = yield from self._read_actions()
                 next_intent = self.state.next_intent(actions)
                 self.isim.send_intent(next_intent)
                 if isinstance(next_intent, Bye):
                     return
-            actions = self.isim.read_actions()
+            actions = yield from self._read_actions()
             next_intent = self.state.next_intent(actions)
             self.isim.send_intent(next_intent)
             if isinstance(next_intent, Bye):
                 return
 
+    def _read_actions(self):
+        while not self.isim.has_actions():
+            yield
+        return self.isim.read_actions()
+
 
 class UserState:
 
@@ -242,6 +259,7 @@ class UserAgenda:
     def __init__(self, goal: Goal, profile: UserProfile):
         self.goal = goal
         self.profile = profile
+        self.rng = profile.rng
 
     def is_satisfied(self):
         return self.goal.satisfied
@@ -253,7 +271,7 @@ class UserAgenda:
             for _ in range(num_inform):
                 available_slots = set(self.goal.get_informable_slot_names()) - inform_values.keys()
                 if available_slots:
-                    slot_name = random.choice(list(available_slots))
+                    slot_name = self.rng.choice(list(available_slots))
                     inform_values[slot_name] = DUMMY_VALUE
             return Transaction(transaction=self.goal.transaction_name, entity_values=inform_values)
         return Bye()
@@ -289,16 +307,16 @@ class UserAgenda:
                 for _ in range(num_slots - 1):
                     informable_values = frame.get_informable_slot_names(informed_values.keys())
                     if len(informable_values) > 0:
-                        rnd_slot = random.choice(informable_values)
+                        rnd_slot = self.rng.choice(informable_values)
                         informed_values[rnd_slot] = DUMMY_VALUE
                 return InformForm(informed_values)
             else:
-                if random.choice([True, False]):
+                if self.rng.choice([True, False]):
                     return InformForm({requested_slot.name: DONT_CARE})
                 else:
                     available_slots = frame.get_informable_slot_names()
                     if available_slots:
-                        rnd_slot = random.choice(available_slots)
+                        rnd_slot = self.rng.choice(available_slots)
                     else:
                         rnd_slot = requested_slot.name
                     return InformForm({rnd_slot: DUMMY_VALUE})
@@ -314,9 +332,9 @@ class UserAgenda:
         return GiveUp()
 
     def on_bool_request(self, slot: Slot):
-        response = random.choice([True, False])
+        response = self.rng.choice([True, False])
         # allow just yes or no answers
-        use_affirm_deny = random.choice([True, False])
+        use_affirm_deny = self.rng.choice([True, False])
         if use_affirm_deny:
             return Affirm(entity=slot.name) if response else Deny(entity=slot.name)
         else:
@@ -343,21 +361,21 @@ class UserAgenda:
                         return AskPreviousOptions()
                     return AskMoreOptions()
                 else:
-                    return SelectOption(random.randint(0, MAX_RESULTS))
+                    return SelectOption(self.rng.randint(0, MAX_RESULTS))
         return Deny()
 
     def on_propose_choice(self, entity):
         if isinstance(self.goal, ChooseGoal):
             if self.profile.do_deny_choice():
                 return Deny()
-            return random.choice([Affirm(), Done()])
+            return self.rng.choice([Affirm(), Done()])
         return Deny()
 
     def on_propose_transaction(self, data):
         if isinstance(self.goal, TransactionGoal):
             if self.profile.do_deny_transaction():
                 return Deny()
-            return random.choice([Affirm(), Done()])
+            return self.rng.choice([Affirm(), Done()])
         return Deny()
 
     def on_failed_transaction(self, data):
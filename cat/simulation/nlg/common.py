@@ -5,7 +5,7 @@ import re
 from num2words import num2words
 from cat.db.database import *
 from typing import List, Dict
-from numpy import random
+from cat.common.rng import Random, default_random
 from datetime import datetime
 
 
@@ -134,48 +134,48 @@ def replace_special_characters(value: str):
     return re.sub(SPECIAL_CHARACTERS_REGEX, '', value).strip()
 
 
-def rephrase_date(value, relative_quota=0.5):
-    if random.uniform(0.0, 1.0) < relative_quota:
-        operator = random.choice(RELATIVE_DATE_OPERATORS)
-        descriptor = random.choice(RELATIVE_DATE_DESCRIPTORS)
-        phrasing = random.choice(RELATIVE_DATE_PHRASINGS)
+def rephrase_date(value, relative_quota=0.5, rng: Random = default_random):
+    if rng.uniform(0.0, 1.0) < relative_quota:
+        operator = rng.choice(RELATIVE_DATE_OPERATORS)
+        descriptor = rng.choice(RELATIVE_DATE_DESCRIPTORS)
+        phrasing = rng.choice(RELATIVE_DATE_PHRASINGS)
         return f'{operator} {descriptor} {phrasing}'.strip().replace('  ', ' ')
     else:
-        format = random.choice(DATE_STRING_FORMATS)
+        format = rng.choice(DATE_STRING_FORMATS)
         if value.year <= 1900:
             value = datetime.now().date()
         return value.strftime(format=format)
 
 
-def rephrase_time(value):
-    return value.strftime(random.choice(TIME_STRING_FORMATS))
+def rephrase_time(value, rng: Random = default_random):
+    return value.strftime(rng.choice(TIME_STRING_FORMATS))
 
 
-def rephrase_datetime(value, use_connector=0.5):
-    s = rephrase_date(value)
-    if random.uniform(0.0, 1.0) > use_connector:
+def rephrase_datetime(value, use_connector=0.5, rng: Random = default_random):
+    s = rephrase_date(value, rng=rng)
+    if rng.uniform(0.0, 1.0) > use_connector:
         s += ' at'
-    s += f' {rephrase_time(value)}'
+    s += f' {rephrase_time(value, rng=rng)}'
     return s
 
 
-def rephrase_string(value: str, obfuscation_quota=0.3):
+def rephrase_string(value: str, obfuscation_quota=0.3, rng: Random = default_random):
     value = value = replace_special_characters(value)
     # lower
-    if random.choice([True, False]):
+    if rng.choice([True, False]):
         value = value.lower()
     tokens = value.split(' ')
     if len(tokens) < 2:
         return value.strip()
     # strip last token
-    if random.uniform(0.0, 1.0) < obfuscation_quota:
+    if rng.uniform(0.0, 1.0) < obfuscation_quota:
         # drop one token at the end
         return replace_special_characters(' '.join(tokens[:-1])).strip()
     return value.strip()
 
 
-def rephrase_integer(value: int, word_quota=0.3, to_ordinal=False):
-    if random.uniform(0.0, 1.0) < word_quota:
+def rephrase_integer(value: int, word_quota=0.3, to_ordinal=False, rng: Random = default_random):
+    if rng.uniform(0.0, 1.0) < word_quota:
         return num_to_word(value, to_ordinal)
     return str(value).strip()
 
@@ -186,15 +186,15 @@ def rephrase_float(value: float, comma_quota=0.5):
     return value
 
 
-def rephrase_bool(value: bool):
+def rephrase_bool(value: bool, rng: Random = default_random):
     if value:
-        return random.choice(TRUE_PHRASINGS)
-    return random.choice(FALSE_PHRASINGS)
+        return rng.choice(TRUE_PHRASINGS)
+    return rng.choice(FALSE_PHRASINGS)
 
 
-def phrase_numeric_operator():
-    operator = random.choice(list(NUMERIC_OPERATORS.keys()))
-    return operator, random.choice(NUMERIC_OPERATORS[operator])
+def phrase_numeric_operator(rng: Random = default_random):
+    operator = rng.choice(list(NUMERIC_OPERATORS.keys()))
+    return operator, rng.choice(NUMERIC_OPERATORS[operator])
 
 
 def find_string_start_end(text, s):
@@ -11,8 +11,9 @@ logger = logging.getLogger('nlg')
 class NlgEngine:
 
     def __init__(self, intent_templates: Dict[str, str] = {}, lookup_table_dir='data/lookup_tables/',
-                 paraphraser_names: List[str] = [], pivot_languages: List[str] = []):
+                 paraphraser_names: List[str] = [], pivot_languages: List[str] = [], rng: Random = default_random):
         self.db: PostgreSQLDatabase = PostgreSQLDatabase.get_instance()
+        self.rng = rng
         self.nlu_data = NLU_DATA_TEMPLATE
         self.intents = []
         self.form_slots = []
@@ -72,8 +73,8 @@ class NlgEngine:
         self._add_intent(INTENT_SELECT_OPTION)
         for template in self.intent_templates[INTENT_SELECT_OPTION]:
             for i in range(num_phrases):
-                choice_number = random.randint(1, MAX_RESULTS)
-                choice = rephrase_integer(choice_number, to_ordinal=random.choice([True, False]))
+                choice_number = self.rng.randint(1, MAX_RESULTS - 1)
+                choice = rephrase_integer(choice_number, to_ordinal=self.rng.choice([True, False]), rng=self.rng)
                 phrasing = template.format(choice=choice)
                 entity_start, entity_end = find_string_start_end(phrasing, choice)
                 entity = get_entity_example(entity_start, entity_end, OPTION_CHOICE_SLOT, choice)
@@ -178,7 +179,7 @@ class NlgEngine:
             choice_template = template.format(slot_name='{slot_name}', choice=f'{{{slot.name}}}')
             for i in range(num_samples_per_template):
                 format_values = {
-                    SLOT_NAME: random.choice(slot.column_nl),
+                    SLOT_NAME: self.rng.choice(slot.column_nl),
                     slot.name: self._get_sample_choice_value(slot)
                 }
                 phrasing, entities = self._phrase_slotted_template(choice_template, in_format_values=format_values)
@@ -234,8 +235,8 @@ class NlgEngine:
         format_values = dict(in_format_values)
         for slot in form_slots:
             data_type = self.db.get_python_datatype(slot.data_type)
-            if data_type in ['integer', 'float'] and random.uniform(0.0, 1.0) < numeric_operator_ratio:
-                operator, operator_phrasing = phrase_numeric_operator()
+            if data_type in ['integer', 'float'] and self.rng.uniform(0.0, 1.0) < numeric_operator_ratio:
+                operator, operator_phrasing = phrase_numeric_operator(rng=self.rng)
                 if operator == '>=<':
                     format_values[slot.name] = f'{operator_phrasing}'.format(
                         value1=str(self._get_sample_form_value(slot)),
@@ -247,9 +248,9 @@ class NlgEngine:
         for slot in choice_slots:
             format_values[slot.name] = self._get_sample_choice_value(slot)
         for slot in nl_slots:
-            format_values[f'{slot.name}_nl'] = random.choice(slot.column_nl)
+            format_values[f'{slot.name}_nl'] = self.rng.choice(slot.column_nl)
         for slot in table_nl_slots:
-            format_values[f'{slot_to_table(slot.name)}_nl'] = random.choice(slot.table_nl) if len(
+            format_values[f'{slot_to_table(slot.name)}_nl'] = self.rng.choice(slot.table_nl) if len(
                 slot.table_nl) > 0 else None
         return get_phrasing_entities(template, format_values)
 
@@ -264,34 +265,34 @@ class NlgEngine:
         sample_value = None
         data_type = self.db.get_python_datatype(slot.data_type)
         if data_type == 'bool':
-            sample_value = random.choice([True, False])
+            sample_value = self.rng.choice([True, False])
         elif data_type in ['date', 'time', 'datetime']:
-            sample_value = datetime.now() + timedelta(days=random.randint(-100, 100), hours=random.randint(0, 23),
-                                                      minutes=random.randint(0, 59), seconds=random.randint(0, 59))
+            sample_value = datetime.now() + timedelta(days=self.rng.randint(-100, 99), hours=self.rng.randint(0, 22),
+                                                      minutes=self.rng.randint(0, 58), seconds=self.rng.randint(0, 58))
         elif data_type == 'integer':
-            sample_value = random.randint(0, 100)
+            sample_value = self.rng.randint(0, 99)
         elif data_type == 'float':
-            sample_value = round(random.uniform(0.5, 10.0), 2)
+            sample_value = round(self.rng.uniform(0.5, 10.0), 2)
         else:
             logger.error(f'Cannot sample datatype {data_type}')
         return self._rephrase_value(data_type, sample_value)
 
     def _rephrase_value(self, data_type: str, value: any):
         if data_type == 'date':
-            return rephrase_date(value)
+            return rephrase_date(value, rng=self.rng)
         if data_type == 'time':
-            return rephrase_time(value)
+            return rephrase_time(value, rng=self.rng)
         if data_type == 'datetime':
-            return rephrase_datetime(value)
+            return rephrase_datetime(value, rng=self.rng)
         if data_type == 'string':
-            return rephrase_string(value)
+            return rephrase_string(value, rng=self.rng)
         if data_type == 'integer':
-            return rephrase_integer(value)
+            return rephrase_integer(value, rng=self.rng)
         if data_type == 'float':
             return rephrase_float(value)
         if data_type == 'bool':
-            return rephrase_bool(value)
-        return str(value) if random.choice([True, False]) else str(value).lower()
+            return rephrase_bool(value, rng=self.rng)
+        return str(value) if self.rng.choice([True, False]) else str(value).lower()
 
     def _add_common_example(self, example):
         self.nlu_data[RASA_NLU_DATA_KEY][COMMON_EXAMPLES_KEY].append(example)
@@ -1,51 +1,228 @@
+import os
 import logging
+import multiprocessing
+from collections import deque
 from threading import Thread
-from typing import List
+from typing import List, Dict, Tuple
+
+from cat.common.rng import Random, default_random
+from cat.db.database import PostgreSQLDatabase
 
 from cat.simulation.common.model import Task
-from cat.simulation.common.persistence import Persistor
+from cat.simulation.common.persistence import Persistor, StoryRecorder
 from cat.simulation.interaction.agent import AgentSimulator
 from cat.simulation.interaction.interaction import InteractionManager
-from cat.simulation.interaction.user import UserSimulator
+from cat.simulation.interaction.user import UserSimulator, UserProfile
 from cat.simulation.interaction.frames import TransactionFrame
 from cat.simulation.interaction.goals import TransactionGoal
 
 logger = logging.getLogger('simulator')
 
+ENGINE_THREADS = 'threads'
+ENGINE_COROUTINES = 'coroutines'
+
+
+class SimulatedDialog:
+    """
+    A single dialog of the coroutine engine with its own user, agent and story. The user and agent simulators are
+    generators that are stepped alternately until neither of them can continue.
+    """
+
+    def __init__(self, story_number: int, task: Task, tasks: List[Task], failure_ratio=0.5,
+                 user_profile: UserProfile = None, rng: Random = default_random):
+        self.story_number = story_number
+        self.story = StoryRecorder()
+        self.interaction = InteractionManager(persistor=self.story)
+        self.user = UserSimulator(self.interaction, tasks, rng=rng)
+        self.agent = AgentSimulator(self.interaction, tasks, failure_ratio=failure_ratio, rng=rng)
+        self.user.prepare(TransactionGoal(task), profile=user_profile)
+        self.agent.prepare(TransactionFrame(task))
+        self._user_steps = self.user.steps()
+        self._agent_steps = self.agent.steps()
+
+    def step(self) -> bool:
+        """
+        Runs the user and then the agent until each of them waits for the other one.
+        :return: True if the dialog can continue, False if it is finished
+        """
+        if self._user_steps and not self._advance_user():
+            self._user_steps = None
+        if self._agent_steps and not self._advance_agent():
+            self._agent_steps = None
+        # the dialog is finished if nobody is left who could read what was sent
+        can_continue = (self._user_steps and self.interaction.has_actions()) or \
+                       (self._agent_steps and self.interaction.has_intent())
+        if not can_continue and (self._user_steps or self._agent_steps):
+            logger.warning(f'Dialog {self.story_number} stopped while a simulator was still waiting')
+        return bool(can_continue)
+
+    def _advance_user(self) -> bool:
+        try:
+            next(self._user_steps)
+            return True
+        except StopIteration:
+            return False
+
+    def _advance_agent(self) -> bool:
+        try:
+            next(self._agent_steps)
+            return True
+        except StopIteration:
+            return False
+
 
 class DialogSimulator:
+    """
+    Simulates the dialogs between a user and the agent. The thread engine runs the user and agent simulator of a
+    dialog in two threads, the coroutine engine steps the dialogs in the current thread and can interleave up to
+    concurrency dialogs. Both engines write the stories in the same order.
 
-    def __init__(self, tasks: List[Task], persistor: Persistor, failure_ratio=0.5):
+    Every dialog draws from its own sub-stream of rng, so the stories of a seeded run do not depend on the engine, the
+    concurrency or the number of workers.
+    """
+
+    def __init__(self, tasks: List[Task], persistor: Persistor, failure_ratio=0.5, engine: str = ENGINE_THREADS,
+                 concurrency: int = 1, rng: Random = default_random):
+        if engine not in [ENGINE_THREADS, ENGINE_COROUTINES]:
+            raise ValueError(f'Unknown simulation engine {engine}')
         self.persistor = persistor
         self.tasks = tasks
+        self.failure_ratio = failure_ratio
+        self.engine = engine
+        self.concurrency = max(1, concurrency)
+        self.rng = rng
         self.interaction = InteractionManager(persistor=persistor)
         self.agent = AgentSimulator(self.interaction, self.tasks, failure_ratio=failure_ratio)
         self.user = UserSimulator(self.interaction, self.tasks)
         self.user_profile = None
 
-    def run(self, num_dialogs: int, tasks: List[Task]):
-        total_dialogs = len(tasks) * num_dialogs
-        story_number = 0
+    def run(self, num_dialogs: int, tasks: List[Task], workers: int = 1):
+        """
+        Simulates num_dialogs dialogs per task. With more than one worker the dialogs are split into consecutive
+        shards that are simulated in a process pool and merged into the stories file in order.
+        """
+        dialog_tasks = [task for task in tasks for _ in range(num_dialogs)]
+        dialog_rngs = self.rng.spawn(len(dialog_tasks))
+        if workers > 1 and len(dialog_tasks) > 1:
+            self._run_workers(dialog_tasks, dialog_rngs, workers)
+        else:
+            self.simulate(dialog_tasks, dialog_rngs)
+
+    def simulate(self, dialog_tasks: List[Task], dialog_rngs: List[Random], first_story: int = 1,
+                 total_dialogs: int = None):
+        """
+        Simulates one dialog per given task with the given generator, the stories are numbered from first_story on.
+        """
+        total_dialogs = total_dialogs or len(dialog_tasks)
+        if self.engine == ENGINE_COROUTINES:
+            self._run_coroutines(dialog_tasks, dialog_rngs, first_story, total_dialogs)
+        else:
+            self._run_threads(dialog_tasks, dialog_rngs, first_story, total_dialogs)
+        self.persistor.close_stories()
 
-        for task in tasks:
-            transaction_frame = TransactionFrame(task)
-            transaction_goal = TransactionGoal(task)
+    def _run_workers(self, dialog_tasks: List[Task], dialog_rngs: List[Random], workers: int):
+        workers = min(workers, len(dialog_tasks))
+        shard_size = -(-len(dialog_tasks) // workers)
+        shards = [(shard, self.persistor.bot_dir, start + 1,
+                   [self.tasks.index(task) for task in dialog_tasks[start:start + shard_size]],
+                   dialog_rngs[start:start + shard_size])
+                  for shard, start in enumerate(range(0, len(dialog_tasks), shard_size))]
+        logger.info(f'Simulating {len(dialog_tasks)} dialogs in {len(shards)} worker processes')
+        db = PostgreSQLDatabase.get_instance()
+        db_args = {'db_name': db.db_name, 'schema_name': db.schema_name, 'user': db.user, 'password': db.password,
+                   'host': db.host, 'port': db.port}
+        simulator_args = {'tasks': self.tasks, 'failure_ratio': self.failure_ratio, 'engine': self.engine,
+                          'concurrency': self.concurrency, 'user_profile': self.user_profile,
+                          'total_dialogs': len(dialog_tasks),
+                          'story_buffer_size': self.persistor.story_writer.buffer_size,
+                          'story_fsync': self.persistor.story_writer.fsync}
+        # spawn instead of fork, a forked worker would share the database connection of this process
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(len(shards), initializer=_init_worker, initargs=(db_args, simulator_args)) as pool:
+            shard_files = pool.map(_simulate_shard, shards)
+        self.persistor.merge_story_shards(shard_files)
+        self.persistor.story_id += len(dialog_tasks)
 
-            for i in range(num_dialogs):
-                story_number += 1
-                self.persistor.new_story()
+    def _run_threads(self, dialog_tasks: List[Task], dialog_rngs: List[Random], first_story: int,
+                     total_dialogs: int):
+        frames: Dict[str, Tuple[TransactionFrame, TransactionGoal]] = {}
+
+        for story_number, task, rng in zip(range(first_story, first_story + len(dialog_tasks)), dialog_tasks,
+                                           dialog_rngs):
+            if task.name not in frames:
+                frames[task.name] = (TransactionFrame(task), TransactionGoal(task))
+            transaction_frame, transaction_goal = frames[task.name]
+            self.persistor.new_story()
+            logger.info(f'Simulating dialog {story_number}/{total_dialogs}')
+
+            self.interaction.prepare()
+            self.user.rng = rng
+            self.agent.rng = rng
+            self.user.prepare(transaction_goal, profile=self.user_profile)
+            self.agent.prepare(transaction_frame)
+
+            # threading to run user and agent simulator
+            user_thread = Thread(target=self.user.run)
+            agent_thread = Thread(target=self.agent.run)
+
+            user_thread.start()
+            agent_thread.start()
+
+            # wait for tasks to finish before continuing
+            agent_thread.join()
+            user_thread.join()
+            self.persistor.end_story()
+
+    def _run_coroutines(self, dialog_tasks: List[Task], dialog_rngs: List[Random], first_story: int,
+                        total_dialogs: int):
+        pending = zip(range(first_story, first_story + len(dialog_tasks)), dialog_tasks, dialog_rngs)
+        running = deque()
+        # finished stories are written in story order, even if a later dialog finishes first
+        finished = {}
+        next_story = first_story
+
+        while True:
+            while len(running) < self.concurrency:
+                story_number, task, rng = next(pending, (None, None, None))
+                if task is None:
+                    break
                 logger.info(f'Simulating dialog {story_number}/{total_dialogs}')
+                running.append(SimulatedDialog(story_number, task, self.tasks, failure_ratio=self.failure_ratio,
+                                               user_profile=self.user_profile, rng=rng))
+            if not running:
+                break
+            dialog = running.popleft()
+            if dialog.step():
+                running.append(dialog)
+                continue
+            finished[dialog.story_number] = dialog.story
+            while next_story in finished:
+                self.persistor.write_story(finished.pop(next_story))
+                next_story += 1
+
+
+# state of a simulation worker process
+_worker = {}
 
-                self.user.prepare(transaction_goal, profile=self.user_profile)
-                self.agent.prepare(transaction_frame)
 
-                # threading to run user and agent simulator
-                user_thread = Thread(target=self.user.run)
-                agent_thread = Thread(target=self.agent.run)
+def _init_worker(db_args: Dict[str, any], simulator_args: Dict[str, any]):
+    PostgreSQLDatabase.get_instance(**db_args)
+    _worker['simulator_args'] = simulator_args
 
-                user_thread.start()
-                agent_thread.start()
 
-                # wait for tasks to finish before continuing
-                agent_thread.join()
-                user_thread.join()
+def _simulate_shard(shard_args) -> str:
+    shard, bot_dir, first_story, task_indices, dialog_rngs = shard_args
+    simulator_args = dict(_worker['simulator_args'])
+    tasks = simulator_args.pop('tasks')
+    user_profile = simulator_args.pop('user_profile')
+    total_dialogs = simulator_args.pop('total_dialogs')
+    story_buffer_size = simulator_args.pop('story_buffer_size')
+    story_fsync = simulator_args.pop('story_fsync')
+    persistor = Persistor(os.path.basename(bot_dir), timestamp=False, story_buffer_size=story_buffer_size,
+                          story_fsync=story_fsync)
+    persistor.use_story_shard(shard, first_story)
+    simulator = DialogSimulator(tasks, persistor, **simulator_args)
+    simulator.user_profile = user_profile
+    simulator.simulate([tasks[i] for i in task_indices], dialog_rngs, first_story=first_story,
+                       total_dialogs=total_dialogs)
+    return persistor.stories_file